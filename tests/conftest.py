@@ -1,5 +1,8 @@
 import os
 
+import pytest
+from django.test import override_settings
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -33,6 +36,15 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
 )
 
+
+@pytest.fixture(autouse=True, scope='session')
+def cache_and_sampling():
+    # Те же кэш и выборка замеров, что у manage.py test (core/testing.py).
+    from core.testing import TEST_SETTINGS
+    with override_settings(**TEST_SETTINGS):
+        yield
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
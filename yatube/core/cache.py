@@ -0,0 +1,259 @@
+"""
+Cache shared by every worker process, kept in an SQLite file.
+
+LocMemCache keeps a separate cache in each process: every gunicorn
+worker warms its own copy, holds its own duplicate of the data and
+never sees invalidations made by the other workers. SQLiteCache keeps
+the entries in one SQLite database on local disk, or in /dev/shm to
+keep it in shared memory. All workers read and invalidate the same
+entries, and no external service is needed.
+
+Entries are evicted least recently used first once the cache holds
+more than MAX_ENTRIES entries or MAX_SIZE bytes. A read records its
+time at most once per ACCESS_RESOLUTION seconds per entry, so hot
+entries do not turn every read into a write.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+UPSERT = (
+    'INSERT INTO cache (key, value, expires, accessed, size) '
+    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+    'value = excluded.value, expires = excluded.expires, '
+    'accessed = excluded.accessed, size = excluded.size'
+)
+LIVE = '(expires IS NULL OR expires > ?)'
+# Столько ключей в одном IN (...).
+CHUNK = 500
+# Сколько записей процесса между проверками размера кэша.
+CULL_EVERY = 100
+BUSY_TIMEOUT = 5
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK):
+        yield items[start:start + CHUNK]
+
+
+def _placeholders(items):
+    return ', '.join('?' * len(items))
+
+
+class SQLiteCache(BaseCache):
+    """Cache in an SQLite database shared by the processes of a host."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._access_resolution = float(
+            options.get('ACCESS_RESOLUTION', 10)
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _db(self):
+        """Connection of this thread and process, opened on first use."""
+        db = getattr(self._local, 'db', None)
+        # После fork соединение родителя не используем.
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.location, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _fetch(self, keys):
+        """Live values of the keys, marking stale ones as just used."""
+        db = self._db()
+        now = time.time()
+        found = {}
+        used = []
+        for chunk in _chunks(keys):
+            rows = db.execute(
+                f'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({_placeholders(chunk)}) AND {LIVE}',
+                (*chunk, now)
+            )
+            for key, value, accessed in rows:
+                found[key] = pickle.loads(value)
+                if accessed < now - self._access_resolution:
+                    used.append(key)
+        for chunk in _chunks(used):
+            db.execute(
+                f'UPDATE cache SET accessed = ? '
+                f'WHERE key IN ({_placeholders(chunk)})',
+                (now, *chunk)
+            )
+        return found
+
+    def _rows(self, data, timeout):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        for key, value in data.items():
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            yield key, value, expires, now, len(key) + len(value)
+
+    def _written(self, count):
+        with self._lock:
+            self._writes += count
+            due = self._writes >= CULL_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self._cull()
+
+    def _cull(self):
+        """Drops expired entries, then least recently used ones."""
+        db = self._db()
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count, size = db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        if count <= self._max_entries and size <= self._max_size:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        # Как у LocMemCache: уходит каждая CULL_FREQUENCY-я запись,
+        # а при лимите в байтах — столько, чтобы в него уложиться.
+        drop = count // self._cull_frequency
+        if size > self._max_size:
+            drop = max(drop, db.execute(
+                'SELECT COUNT(*) FROM (SELECT SUM(size) OVER '
+                '(ORDER BY accessed DESC, key DESC) AS total FROM cache) '
+                'WHERE total > ?',
+                (self._max_size - self._max_size // self._cull_frequency,)
+            ).fetchone()[0])
+        db.execute(
+            'DELETE FROM cache WHERE key IN '
+            '(SELECT key FROM cache ORDER BY accessed, key LIMIT ?)',
+            (drop,)
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        return {
+            made[key]: value for key, value in self._fetch(made).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._db().execute(UPSERT, next(self._rows({key: value}, timeout)))
+        self._written(1)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        made = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            made[key] = value
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(UPSERT, self._rows(made, timeout))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self._written(len(made))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = next(self._rows({key: value}, timeout))
+        # Истёкшая запись не мешает добавить ключ заново.
+        cursor = self._db().execute(
+            UPSERT + ' WHERE cache.expires <= excluded.accessed', row
+        )
+        self._written(cursor.rowcount)
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._db().execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {LIVE}',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {LIVE}',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(key) + len(blob), key)
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {LIVE}',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._db().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        db = self._db()
+        for chunk in _chunks(keys):
+            db.execute(
+                f'DELETE FROM cache WHERE key IN ({_placeholders(chunk)})',
+                chunk
+            )
+
+    def clear(self):
+        self._db().execute('DELETE FROM cache')
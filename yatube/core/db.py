@@ -0,0 +1,44 @@
+"""
+Retries of transactions that found the database locked.
+
+Write transactions of the SQLite backend (core/sqlite3) wait for the
+lock for busy_timeout. A writer that waited longer than that, behind a
+slow transaction, is run again by retry_locked() instead of failing
+the request.
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+# Первая пауза перед повтором, секунды; дальше вдвое больше.
+RETRY_DELAY = 0.05
+
+
+def is_locked(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def retry_locked(function):
+    """
+    Runs the function, a whole transaction, again while SQLite reports
+    the database as locked: up to DATABASE_LOCK_RETRIES times, with
+    growing random pauses. Inside an outer transaction there is
+    nothing to retry, the error goes up.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        retries = settings.DATABASE_LOCK_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return function(*args, **kwargs)
+            except OperationalError as error:
+                if (
+                    attempt == retries or not is_locked(error)
+                    or transaction.get_connection().in_atomic_block
+                ):
+                    raise
+            time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1))
+    return wrapper
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from core.stats import percentile
+
+PERCENTILES = (50, 95, 99)
+# Сколько ключей в одном get_many: столько карточек на странице ленты.
+MANY = 10
+
+
+def percentiles(timings):
+    return {p: percentile(timings, p) for p in PERCENTILES}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку кэшей из CACHE_BACKENDS: set, попадание '
+        'get и get_many, промах get. Каждый кэш создаётся заново во '
+        'временном каталоге.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations', type=int, default=2000,
+            help='Замеряемых операций каждого вида.'
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=4096,
+            help='Размер значения в байтах.'
+        )
+        parser.add_argument(
+            '--backend', action='append', dest='backends',
+            choices=sorted(settings.CACHE_BACKENDS),
+            help='Замерить только этот кэш (можно повторять).'
+        )
+
+    def handle(self, *args, **options):
+        backends = options['backends'] or list(settings.CACHE_BACKENDS)
+        self.stdout.write(
+            f'{"кэш":<8} {"операция":<10} {"p50 мкс":>9} '
+            f'{"p95 мкс":>9} {"p99 мкс":>9}'
+        )
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as directory:
+                cache = self.make_cache(backend, directory)
+                results = self.measure(
+                    cache, options['operations'], options['value_size']
+                )
+            for operation, timings in results.items():
+                cuts = percentiles(timings)
+                self.stdout.write(
+                    f'{backend:<8} {operation:<10} '
+                    + ' '.join(f'{cuts[p]:>9.1f}' for p in PERCENTILES)
+                )
+
+    @staticmethod
+    def make_cache(backend, directory):
+        location = {
+            'sqlite': os.path.join(directory, 'cache.sqlite3'),
+            'file': directory,
+        }.get(backend, f'benchmark-{directory}')
+        params = dict(settings.CACHES['default'])
+        params.pop('BACKEND')
+        params.pop('LOCATION', None)
+        return import_string(settings.CACHE_BACKENDS[backend])(
+            location, params
+        )
+
+    @staticmethod
+    def measure(cache, operations, value_size):
+        """Per-operation latencies in microseconds."""
+        value = 'x' * value_size
+        keys = [f'benchmark:{i}' for i in range(operations)]
+        results = {'set': [], 'get': [], 'get_many': [], 'get miss': []}
+
+        def timed(name, call, *args):
+            started = time.perf_counter()
+            call(*args)
+            results[name].append((time.perf_counter() - started) * 1e6)
+
+        for key in keys:
+            timed('set', cache.set, key, value, None)
+        for key in keys:
+            timed('get', cache.get, key)
+        for start in range(operations):
+            batch = [keys[(start + i) % operations] for i in range(MANY)]
+            timed('get_many', cache.get_many, batch)
+        for key in keys:
+            timed('get miss', cache.get, key + ':missing')
+        cache.clear()
+        return results
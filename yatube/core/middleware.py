@@ -0,0 +1,170 @@
+"""
+Per-request performance timings.
+
+A sampled share of requests (REQUEST_TIMING_SAMPLE_RATE) records the
+resolved view, wall time, database time and query count, template
+render time and cache hits and misses. They are written as one JSON
+log line of the core.middleware logger and as a Server-Timing header
+that browser dev tools show next to the request. Templates are timed
+by the core.template backend, which asks current_timings() whether the
+request is sampled.
+
+Requests out of the sample only cost two clock reads. They are logged
+with their wall time when slower than REQUEST_TIMING_SLOW_MS, so slow
+views show up whatever the sample rate.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_MISSING = object()
+
+
+class Timings:
+    """Counters of one sampled request."""
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+        self.rendering = False
+        self.hits = 0
+        self.misses = 0
+        self.in_get_many = False
+
+    def execute(self, execute, sql, params, many, context):
+        """connection.execute_wrapper() hook."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def render(self, render, context, request):
+        """core.template hook: times the outermost template."""
+        if self.rendering:
+            return render(context, request)
+        self.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(context, request)
+        finally:
+            self.template += time.perf_counter() - started
+            self.rendering = False
+
+    def count_cache(self, cache, stack):
+        """Counts hits and misses of the cache until the stack closes."""
+        get, get_many = cache.get, cache.get_many
+
+        def counted_get(key, default=None, version=None):
+            value = get(key, _MISSING, version=version)
+            if not self.in_get_many:
+                if value is _MISSING:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return default if value is _MISSING else value
+
+        def counted_get_many(keys, version=None):
+            keys = list(keys)
+            # Базовый get_many сам зовёт get по ключу.
+            self.in_get_many = True
+            try:
+                found = get_many(keys, version=version)
+            finally:
+                self.in_get_many = False
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+        # Экземпляр кэша свой у каждого потока: подмена не задевает
+        # параллельные запросы.
+        cache.get, cache.get_many = counted_get, counted_get_many
+        stack.callback(delattr, cache, 'get')
+        stack.callback(delattr, cache, 'get_many')
+
+
+def current_timings():
+    """Timings of the sampled request of this thread, or None."""
+    return getattr(_local, 'timings', None)
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestTimingMiddleware:
+    """Samples request timings into the log and a Server-Timing header."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            response = self.get_response(request)
+            total = time.perf_counter() - started
+            if total * 1000 >= settings.REQUEST_TIMING_SLOW_MS:
+                self.log(request, response, {
+                    'total_ms': _milliseconds(total), 'sampled': False
+                })
+            return response
+        timings = Timings()
+        _local.timings = timings
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(timings.execute)
+                    )
+                for alias in settings.CACHES:
+                    timings.count_cache(caches[alias], stack)
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        total = time.perf_counter() - started
+        fields = {
+            'total_ms': _milliseconds(total),
+            'db_ms': _milliseconds(timings.db),
+            'queries': timings.queries,
+            'template_ms': _milliseconds(timings.template),
+            'cache_hits': timings.hits,
+            'cache_misses': timings.misses,
+            'sampled': True,
+        }
+        response['Server-Timing'] = ', '.join((
+            f'app;dur={fields["total_ms"]};desc="{self.view_name(request)}"',
+            f'db;dur={fields["db_ms"]};desc="queries={timings.queries}"',
+            f'tpl;dur={fields["template_ms"]}',
+            f'cache;desc="hits={timings.hits} misses={timings.misses}"',
+        ))
+        self.log(request, response, fields)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else '-'
+
+    def log(self, request, response, fields):
+        record = {
+            'view': self.view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **fields,
+        }
+        logger.info(
+            json.dumps(record, ensure_ascii=False), extra={'timing': record}
+        )
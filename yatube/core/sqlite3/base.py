@@ -0,0 +1,28 @@
+"""
+SQLite database backend tuned for concurrent requests.
+
+Every new connection runs SQLITE_PRAGMAS: WAL lets readers of the
+feeds go on while create_post or add_comment writes, synchronous=NORMAL
+drops the fsync of every commit (WAL stays consistent), mmap and a
+larger page cache keep hot pages in memory, busy_timeout makes a
+writer wait for the lock instead of failing. With CONN_MAX_AGE the
+pragmas run once per connection, not once per request.
+
+Transactions start with BEGIN IMMEDIATE. A deferred transaction that
+read before another connection committed cannot take the write lock
+and fails at once, without waiting for busy_timeout; an immediate one
+queues for the lock from its first statement.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
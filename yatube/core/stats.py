@@ -0,0 +1,15 @@
+"""Timing statistics of the benchmark commands, Python 3.7 included."""
+import math
+
+
+def percentile(values, p):
+    """
+    The p-th percentile of the values, interpolated between the closest
+    ranks: statistics.quantiles(method='inclusive') of Python 3.8+.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    fraction = position - lower
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
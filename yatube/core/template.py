@@ -0,0 +1,30 @@
+"""
+Django template backend whose renders core.middleware can time.
+
+Its templates report their render time to the timings of a sampled
+request (core.middleware.current_timings). Out of the sample render()
+costs one thread-local read more than the stock backend.
+"""
+from django.template import TemplateDoesNotExist
+from django.template.backends import django
+
+from .middleware import current_timings
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        timings = current_timings()
+        if timings is None:
+            return super().render(context, request)
+        return timings.render(super().render, context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
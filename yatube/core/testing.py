@@ -0,0 +1,34 @@
+"""
+Settings of the test runs.
+
+Tests keep the cache in the memory of the process instead of the
+shared sqlite file of the server, sample no requests unless a test
+turns the sampling on, and render thumbnails without a process pool.
+TestRunner (TEST_RUNNER of manage.py test) and the pytest conftest
+apply the same override for the whole run.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    },
+    'REQUEST_TIMING_SAMPLE_RATE': 0,
+    # Миниатюры — в процессе теста, с его MEDIA_ROOT и базой.
+    'POST_THUMBNAIL_WORKERS': 0,
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
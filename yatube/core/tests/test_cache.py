@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {
+            'OPTIONS': {'ACCESS_RESOLUTION': 0, **options}
+        })
+
+    def test_values_are_shared_between_instances(self):
+        """Every worker process opens its own instance of the file."""
+        other = self.make_cache()
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(other.get('key'), {'value': [1, 2]})
+        other.set_many({'a': 1, 'b': 2}, None)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        other.delete_many(['a', 'key'])
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'b': 2})
+
+    def test_add_incr_and_expiry(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self.cache.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('short', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertTrue(self.cache.add('short', 'again'))
+        self.assertEqual(self.cache.get('short'), 'again')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.set_many({f'old{i}': i for i in range(50)})
+        time.sleep(0.01)
+        cache.set('kept', 'value')
+        cache.set_many({f'new{i}': i for i in range(50)})
+        time.sleep(0.01)
+        cache.get('kept')
+        cache._cull()
+        self.assertEqual(cache.get_many([f'old{i}' for i in range(50)]), {})
+        self.assertEqual(cache.get('kept'), 'value')
+
+    def test_size_limit_is_kept(self):
+        cache = self.make_cache(MAX_SIZE=10000, CULL_FREQUENCY=2)
+        for i in range(100):
+            cache.set(f'key{i}', 'x' * 1000)
+        size = cache._db().execute('SELECT SUM(size) FROM cache').fetchone()
+        self.assertLessEqual(size[0], 10000)
+        self.assertEqual(cache.get('key99'), 'x' * 1000)
+        self.assertIsNone(cache.get('key0'))
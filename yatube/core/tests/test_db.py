@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.db import retry_locked
+
+
+class SQLiteTuningTests(TestCase):
+    def test_new_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('synchronous', 'cache_size', 'busy_timeout')
+            }
+        self.assertEqual(
+            pragmas,
+            {'synchronous': 1, 'cache_size': -64 * 1024, 'busy_timeout': 5000}
+        )
+
+    def test_transactions_take_the_write_lock_at_once(self):
+        with mock.patch.object(connection, 'cursor') as cursor:
+            connection._start_transaction_under_autocommit()
+        cursor().execute.assert_called_once_with('BEGIN IMMEDIATE')
+
+
+@override_settings(DATABASE_LOCK_RETRIES=2)
+@mock.patch('core.db.time.sleep')
+class RetryLockedTests(SimpleTestCase):
+    def test_locked_transaction_is_retried(self, sleep):
+        calls = mock.Mock(side_effect=[
+            OperationalError('database is locked'), 'saved'
+        ])
+        self.assertEqual(retry_locked(calls)(1, key='value'), 'saved')
+        self.assertEqual(calls.call_count, 2)
+        calls.assert_called_with(1, key='value')
+        sleep.assert_called_once()
+
+    def test_other_errors_and_last_attempt_go_up(self, sleep):
+        calls = mock.Mock(side_effect=OperationalError('no such table'))
+        with self.assertRaises(OperationalError):
+            retry_locked(calls)()
+        self.assertEqual(calls.call_count, 1)
+        calls = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            retry_locked(calls)()
+        self.assertEqual(calls.call_count, 3)
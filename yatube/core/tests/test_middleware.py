@@ -0,0 +1,72 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import engines
+from django.template.backends import django
+from django.test import Client, TestCase, override_settings
+
+from core import middleware
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1, REQUEST_TIMING_SLOW_MS=1000)
+class RequestTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_sampled_request_is_timed(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            self.client.get('/')
+            response = self.client.get('/')
+        cold = logs.records[0].timing
+        self.assertGreater(cold['template_ms'], 0)
+        self.assertGreaterEqual(cold['total_ms'], cold['template_ms'])
+        record = json.loads(logs.records[1].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], 0)
+        self.assertGreater(record['cache_hits'], 0)
+        self.assertEqual(record['cache_misses'], 0)
+        # Страница целиком из кэша: шаблоны не рендерятся.
+        self.assertEqual(record['template_ms'], 0)
+        header = response['Server-Timing']
+        self.assertIn('app;dur=', header)
+        self.assertIn('desc="posts:index"', header)
+        self.assertIn('desc="queries=0"', header)
+
+    def test_cold_cache_misses_are_counted(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            self.client.get('/')
+        record = logs.records[0].timing
+        self.assertEqual(record['queries'], 1)
+        self.assertGreater(record['db_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0, REQUEST_TIMING_SLOW_MS=0)
+    def test_unsampled_request_logs_only_wall_time(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get('/nonexist-page/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(
+            set(logs.records[0].timing),
+            {'view', 'method', 'path', 'status', 'total_ms', 'sampled'}
+        )
+        self.assertEqual(logs.records[0].timing['view'], '-')
+
+    def test_templates_are_timed_only_in_sampled_requests(self):
+        # Django не подменён: время считает бэкенд core.template.
+        self.assertEqual(
+            django.Template.render.__module__, django.__name__
+        )
+        template = engines['django'].from_string('{{ text }}')
+        self.assertIsNone(middleware.current_timings())
+        self.assertEqual(template.render({'text': 'вне'}), 'вне')
+        timings = middleware.Timings()
+        with mock.patch(
+            'core.template.current_timings', return_value=timings
+        ):
+            self.assertEqual(template.render({'text': 'в выборке'}),
+                             'в выборке')
+        self.assertGreater(timings.template, 0)
+        self.assertFalse(timings.rendering)
@@ -0,0 +1,14 @@
+from django.test import SimpleTestCase
+
+from core.stats import percentile
+
+
+class PercentileTests(SimpleTestCase):
+    def test_percentiles_interpolate_between_ranks(self):
+        timings = [4.0, 1.0, 3.0, 2.0, 5.0]
+        self.assertEqual(percentile(timings, 50), 3.0)
+        self.assertAlmostEqual(percentile(timings, 95), 4.8)
+        self.assertAlmostEqual(percentile(timings, 99), 4.96)
+
+    def test_single_timing_is_every_percentile(self):
+        self.assertEqual(percentile([7.5], 99), 7.5)
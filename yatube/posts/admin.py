@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Group, Post, Follow
 from yatube.settings import EMPTY_VALUE
 
@@ -18,6 +19,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = EMPTY_VALUE
 
+    def get_search_results(self, request, queryset, search_term):
+        """Searches the full-text index instead of LIKE '%term%'."""
+        found = search.filter_matching(queryset, search_term)
+        if found is None:
+            return queryset, False
+        return found, False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -36,6 +44,15 @@ class CommentAdmin(admin.ModelAdmin):
     list_filter = ('created', 'author',)
     empty_value_display = EMPTY_VALUE
 
+    def get_search_results(self, request, queryset, search_term):
+        """Searches the full-text index of comments."""
+        found = search.filter_matching(
+            queryset, search_term, search.COMMENTS_TABLE
+        )
+        if found is None:
+            return queryset, False
+        return found, False
+
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
@@ -0,0 +1,307 @@
+"""
+JSON API of the feeds, posts and comments, read-only but for the
+batch follow of follow_batch().
+
+Lists are the cursor pages of the HTML feeds (?cursor= and the legacy
+?page=), fetched with only() the columns the JSON shows.
+
+Every response carries a strong ETag and Last-Modified. Feeds with a
+cache scope (index, group, profile) derive both from the scope
+generations of posts/cache.py, which are the times of the last write
+to the scope: a revalidation is answered with 304 before any post is
+read. The follow feed, a post and its comments are tagged with a hash
+of the body and the newest date in it; a 304 saves the transfer, and
+only If-None-Match is trusted since a deletion leaves dates as they
+were.
+"""
+import json
+from hashlib import md5
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST
+
+from . import follows, graph
+from .cache import scope_validators
+from .counters import user_stats
+from .feed import FollowFeedPaginator
+from .models import Comment, Group, Post
+from .paginator import CommentPaginator, paginate
+from core.db import retry_locked
+from yatube.settings import COMMENTS_ON_PAGE
+
+User = get_user_model()
+
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'updated', 'image', 'comments_count',
+    'author', 'author__username', 'group', 'group__slug', 'group__title',
+)
+COMMENT_FIELDS = ('id', 'text', 'created', 'author', 'author__username')
+
+
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'updated': post.updated,
+        'author': post.author.username,
+        'group': post.group and {
+            'slug': post.group.slug, 'title': post.group.title
+        },
+        'image': post.image.url if post.image else None,
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    }
+
+
+def page_links(request, page):
+    """Urls of the next and previous pages, None at the ends."""
+    paginator = page.paginator
+    if paginator.is_cursor:
+        pages = {
+            'next': paginator.next_cursor,
+            'previous': paginator.previous_cursor,
+        }
+        param = 'cursor'
+    else:
+        pages = {
+            'next': page.has_next() and page.next_page_number(),
+            'previous': page.has_previous() and page.previous_page_number(),
+        }
+        param = 'page'
+    links = {}
+    for name, value in pages.items():
+        if not value:
+            links[name] = None
+            continue
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        params.pop('page', None)
+        params[param] = value
+        links[name] = f'{request.path}?{params.urlencode()}'
+    return links
+
+
+def not_modified(request, etag, last_modified=None):
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def json_response(request, payload, last_modified=None, etag=None):
+    """
+    JSON of the payload with validators; ETag defaults to the body
+    hash. Conditional requests get 304.
+    """
+    body = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False)
+    trusted_modified = None
+    if etag is None:
+        etag = quote_etag(md5(body.encode()).hexdigest())
+    else:
+        trusted_modified = last_modified
+    response = not_modified(request, etag, trusted_modified)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def newest(*dates):
+    """Unix time of the newest of the dates, None for no dates."""
+    dates = [date for date in dates if date is not None]
+    if not dates:
+        return None
+    return int(max(dates).timestamp())
+
+
+def feed_response(request, posts, scope, count=None):
+    etag, last_modified = scope_validators(request, scope)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    page = paginate(request, posts.only(*POST_FIELDS), count=count)
+    payload = {
+        'results': [serialize_post(post) for post in page],
+        **page_links(request, page),
+    }
+    return json_response(request, payload, last_modified, etag)
+
+
+def index(request):
+    """Posts of the main feed. Queries: the posts page."""
+    return feed_response(
+        request, Post.objects.select_related('author', 'group'), 'index'
+    )
+
+
+def group_posts(request, slug):
+    """Posts of the group. Queries: the group, the posts page."""
+    group = get_object_or_404(
+        Group.objects.only('id', 'posts_count'), slug=slug
+    )
+    return feed_response(
+        request,
+        Post.objects.filter(group=group).select_related('author', 'group'),
+        f'group:{group.id}',
+        group.posts_count
+    )
+
+
+def profile(request, username):
+    """Posts of the author. Queries: the author, the posts page."""
+    author = get_object_or_404(
+        User.objects.select_related('stats').only('id', 'stats__posts_count'),
+        username=username
+    )
+    return feed_response(
+        request,
+        Post.objects.filter(author=author).select_related('author', 'group'),
+        f'author:{author.id}',
+        user_stats(author).posts_count
+    )
+
+
+def unauthorized():
+    return JsonResponse({'detail': 'Требуется вход.'}, status=401)
+
+
+def follow_index(request):
+    """
+    Posts of the followed authors. Queries: the session user, the
+    followed authors (posts/graph.py, cached), the feed page, followed
+    celebrities.
+    """
+    if not request.user.is_authenticated:
+        return unauthorized()
+    page = paginate(
+        request,
+        Post.objects.filter(
+            author_id__in=list(graph.following(request.user.id))
+        ).select_related('author', 'group').only(*POST_FIELDS),
+        FollowFeedPaginator,
+        user=request.user
+    )
+    posts = list(page)
+    payload = {
+        'results': [serialize_post(post) for post in posts],
+        **page_links(request, page),
+    }
+    return json_response(
+        request, payload, newest(*(post.updated for post in posts))
+    )
+
+
+def post_detail(request, post_id):
+    """The post. Queries: the post."""
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group').only(*POST_FIELDS),
+        pk=post_id
+    )
+    payload = {
+        **serialize_post(post),
+        'comments': reverse('posts:api_comments', args=[post.id]),
+    }
+    return json_response(request, payload, newest(post.updated))
+
+
+def post_comments(request, post_id):
+    """
+    Comments of the post, newest first. Queries: the comments page;
+    the post only for an empty page.
+    """
+    paginator = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author')
+        .only(*COMMENT_FIELDS),
+        COMMENTS_ON_PAGE
+    )
+    comments = list(paginator.cursor_page(request.GET.get('cursor')))
+    if not comments:
+        # Непустая страница доказывает, что пост есть: комментарии
+        # удаляются вместе с ним.
+        get_object_or_404(Post.objects.only('id'), pk=post_id)
+    next_cursor = paginator.next_cursor
+    payload = {
+        'results': [serialize_comment(comment) for comment in comments],
+        'next': next_cursor and (
+            f'{reverse("posts:api_comments", args=[post_id])}'
+            f'?cursor={next_cursor}'
+        ),
+    }
+    return json_response(
+        request, payload,
+        newest(*(comment.created for comment in comments))
+    )
+
+
+def usernames(request):
+    """Lists 'follow' and 'unfollow' of a JSON body or a form."""
+    if request.content_type != 'application/json':
+        return request.POST.getlist('follow'), request.POST.getlist('unfollow')
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise ValueError(data)
+    lists = data.get('follow', []), data.get('unfollow', [])
+    for names in lists:
+        if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names
+        ):
+            raise ValueError(names)
+    return lists
+
+
+@require_POST
+def follow_batch(request):
+    """
+    Follows and unfollows many authors in one request and transaction:
+    {"follow": [usernames], "unfollow": [usernames]}, as JSON or form
+    fields. Answers with the names actually followed, unfollowed and
+    not found. Queries: the session user, the authors, then the same
+    handful of writes for any number of authors (posts/follows.py).
+    """
+    if not request.user.is_authenticated:
+        return unauthorized()
+    try:
+        follow, unfollow = usernames(request)
+    except ValueError:
+        return JsonResponse(
+            {'detail': 'Ожидаются списки имён follow и unfollow.'},
+            status=400
+        )
+    if len(follow) + len(unfollow) > settings.FOLLOW_BATCH_LIMIT:
+        return JsonResponse(
+            {'detail': f'Не больше {settings.FOLLOW_BATCH_LIMIT} имён.'},
+            status=400
+        )
+    ids = follows.authors(follow + unfollow)
+    followed, unfollowed = retry_locked(transaction.atomic(follows.apply))(
+        request.user.id,
+        [ids[name] for name in follow if name in ids],
+        [ids[name] for name in unfollow if name in ids]
+    )
+    names = {author_id: name for name, author_id in ids.items()}
+    return JsonResponse({
+        'followed': [names[author_id] for author_id in followed],
+        'unfollowed': [names[author_id] for author_id in unfollowed],
+        'unknown': sorted(set(follow + unfollow) - set(ids)),
+    })
@@ -0,0 +1,102 @@
+"""
+Fragment cache of the post feeds.
+
+Fragment keys embed a generation number of every scope the fragment
+depends on ('index', 'group:<id>', 'author:<id>' and 'groups' for
+group titles shown on cards; 'followers:<id>' counts follows of
+an author on profile pages; 'following:<id>' versions the followed
+authors of a user, posts/graph.py, and 'suggestions:<id>' the authors
+suggested to a user, posts/suggestions.py). Signals bump generations
+on writes, so
+fragments can live for FEED_CACHE_TIMEOUT without ever going stale:
+old keys are simply never asked for again and age out of the cache.
+
+A generation is the time of the last write to its scope in ms, so it
+also serves as the Last-Modified time of the feed (posts/api.py,
+posts/conditional.py).
+
+A write inside a transaction moves its scopes twice: at once, and
+again when the transaction commits. A reader rendering in between
+still sees the rows before the commit, but whatever it stores under
+the first generation is never asked for after the second one.
+"""
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import quote_etag
+
+GROUPS = 'groups'
+
+
+def _generation_key(scope):
+    return f'posts:generation:{scope}'
+
+
+def _new_generation():
+    # Выросшее из времени значение не совпадёт с поколением,
+    # вытесненным из кэша вместе со своими фрагментами.
+    return int(time.time() * 1000)
+
+
+def _move(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    now = _new_generation()
+    # Не меньше прежнего + 1: две записи в одну миллисекунду всё равно
+    # дают разные поколения.
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+def invalidate(*scopes):
+    """
+    Moves the scopes to a new generation: the time of this write, and
+    once more after the commit of the current transaction.
+    """
+    _move(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _move(scopes))
+
+
+def generations(*scopes):
+    """Current generation of every scope, starting the missing ones."""
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def feed_cache_key(request, scope):
+    """Fragment key of a feed page: scope generations plus page token."""
+    return ':'.join([
+        scope,
+        *(str(generation) for generation in generations(scope, GROUPS)),
+        request.GET.get('cursor', ''),
+        request.GET.get('page', '')
+    ])
+
+
+def scope_validators(request, *scopes, vary=()):
+    """
+    ETag and Last-Modified (unix time) of a page showing the scopes,
+    read from the cache only. vary adds what else the page depends on.
+    """
+    versions = generations(*scopes, GROUPS)
+    page = (request.GET.get('cursor', ''), request.GET.get('page', ''))
+    tag = md5(repr((scopes, versions, page, vary)).encode()).hexdigest()
+    return quote_etag(tag), max(versions) // 1000
+
+
+def feed_cache_context(request, scope):
+    """Template context for `{% cache cache_timeout ... cache_key %}`."""
+    return {
+        'cache_key': feed_cache_key(request, scope),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,183 @@
+"""
+Conditional GET of the HTML feeds.
+
+A page is validated by the generations of the cache scopes it shows
+(posts/cache.py), which are the times of the last write to each scope.
+A browser or a reverse proxy revalidating a page gets 304 before the
+view runs: nothing is queried for the posts and nothing is rendered.
+
+Anonymous pages are the same for everyone and public for FEED_MAX_AGE
+seconds. Pages of a signed-in user show their name, links and forms:
+they are private and revalidated on every use, and their ETag also
+covers the user and the CSRF cookie the forms are signed with, as well
+as the scopes of the user's follows and suggestions that the follow
+button and "Who to follow" show.
+Every page varies on Cookie.
+
+Past the revalidation, pages come from a full-page cache keyed by the
+same generations. A page is rendered once for all readers, as for an
+anonymous one, with markers in place of the fragments that depend on
+the reader (posts/holes.py). Anonymous readers get the stored page as
+is; a signed-in reader gets it with the holes filled for them, so the
+header, the follow button and the comment form stay personal.
+"""
+from contextlib import contextmanager
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date
+
+from . import graph, holes, suggestions, trending
+from .cache import scope_validators
+from .models import Group, Post
+
+User = get_user_model()
+
+
+def viewer(request):
+    """What a page shows of its viewer: nothing for anonymous users."""
+    if not request.user.is_authenticated:
+        return ()
+    return (
+        request.user.id, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    )
+
+
+def viewer_scopes(request):
+    """Cache scopes of what a page shows of its viewer's follows."""
+    if not request.user.is_authenticated:
+        return ()
+    return (graph.scope(request.user.id), suggestions.scope(request.user.id))
+
+
+def cache_headers(request, response):
+    """Vary and Cache-Control of a feed page."""
+    patch_vary_headers(response, ('Cookie',))
+    if request.user.is_authenticated or response.cookies:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.FEED_MAX_AGE
+        )
+
+
+def conditional_page(scopes):
+    """
+    Answers revalidations of the view with 304. scopes(**kwargs) names
+    the cache scopes the page shows, or returns None to let the view
+    answer (404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, **kwargs)
+            page_scopes = scopes(**kwargs)
+            if page_scopes is None:
+                return view(request, **kwargs)
+            vary = viewer(request)
+            shared_etag, last_modified = scope_validators(
+                request, *page_scopes
+            )
+            etag = shared_etag
+            if vary:
+                etag, last_modified = scope_validators(
+                    request, *page_scopes, *viewer_scopes(request),
+                    vary=vary
+                )
+            # Время правки общее для всех читателей: страницу читателя
+            # проверяем только по ETag.
+            response = get_conditional_response(
+                request, etag=etag,
+                last_modified=None if vary else last_modified
+            )
+            if response is None:
+                response = cached_page(view, request, kwargs, shared_etag)
+            if response.status_code not in (200, 304):
+                return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            cache_headers(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def shared_reader(request):
+    """Renders the request as the anonymous reader of the shared page."""
+    user = request.user
+    request.user = AnonymousUser()
+    request.punching_holes = True
+    try:
+        yield
+    finally:
+        request.user = user
+        request.punching_holes = False
+
+
+def cached_page(view, request, kwargs, etag):
+    """
+    The page from the full-page cache, rendered by the view on a miss.
+    Only the holes of the page are rendered for a signed-in reader.
+    """
+    key = md5(f'{request.get_full_path()}:{etag}'.encode()).hexdigest()
+    key = f'posts:page:{key}'
+    page = cache.get(key)
+    if page is None:
+        with shared_reader(request):
+            response = view(request, **kwargs)
+            parts = holes.split(response.content.decode(response.charset))
+            if response.status_code == 200 and not response.cookies:
+                page = {
+                    'parts': parts,
+                    'anonymous': holes.fill(request, parts),
+                    'content_type': response['Content-Type'],
+                }
+        if page is None:
+            # Ошибки не запоминаем: дыры заполняются сразу для читателя.
+            response.content = holes.fill(request, parts)
+            return response
+        cache.set(key, page, settings.FEED_CACHE_TIMEOUT)
+    if request.user.is_authenticated:
+        content = holes.fill(request, page['parts'])
+    else:
+        content = page['anonymous']
+    return HttpResponse(content, content_type=page['content_type'])
+
+
+def index_scopes():
+    return ['index']
+
+
+def trending_scopes():
+    return [trending.SCOPE]
+
+
+def group_scopes(slug):
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('id', flat=True).first()
+    return group_id and [f'group:{group_id}']
+
+
+def profile_scopes(username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('id', flat=True).first()
+    return author_id and [f'author:{author_id}', f'followers:{author_id}']
+
+
+def detail_scopes(post_id):
+    author_id = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+    return author_id and [f'author:{author_id}']
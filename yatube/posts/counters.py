@@ -0,0 +1,132 @@
+"""
+Denormalized counters: posts per author and group, followers and
+following per user, comments per post.
+
+Writes keep them up to date through posts.signals with single-row
+F() updates, bulk writes (posts.follows) with one UPDATE for many
+rows; recount() rebuilds all of them in bulk.
+"""
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _count(model, field):
+    """Correlated COUNT(*) of model rows pointing to the outer row."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount(apps=django_apps):
+    """
+    Recomputes every counter from the source tables.
+    Returns the number of rows that had drifted, per counter.
+    Works with the historical models of a migration as well.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    counters = (
+        (Group, 'posts_count', _count(Post, 'group')),
+        (Post, 'comments_count', _count(Comment, 'post')),
+        (UserStats, 'posts_count', _count(Post, 'author')),
+        (UserStats, 'followers_count', _count(Follow, 'author')),
+        (UserStats, 'following_count', _count(Follow, 'user')),
+    )
+    drift = {}
+    with transaction.atomic():
+        UserStats.objects.bulk_create(
+            [
+                UserStats(user_id=user_id)
+                for user_id in User.objects.filter(
+                    stats__isnull=True
+                ).values_list('pk', flat=True)
+            ],
+            batch_size=500
+        )
+        for model, field, actual in counters:
+            label = f'{model._meta.model_name}.{field}'
+            drift[label] = model.objects.annotate(
+                actual=actual
+            ).exclude(**{field: F('actual')}).count()
+            if drift[label]:
+                model.objects.update(**{field: actual})
+    return drift
+
+
+def user_stats(user):
+    """
+    Counters of the user. A user without the row (created around the
+    signals, e.g. by bulk_create) gets live counts, not saved.
+    """
+    stats = getattr(user, 'stats', None)
+    if stats is not None:
+        return stats
+    UserStats = django_apps.get_model('posts', 'UserStats')
+    return UserStats(
+        user=user,
+        posts_count=user.posts.count(),
+        followers_count=user.following.count(),
+        following_count=user.follower.count()
+    )
+
+
+def _shifted(deltas):
+    return {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+
+
+def bump(model, pk, **deltas):
+    """Shifts counters of one row by the deltas in a single UPDATE."""
+    return model.objects.filter(pk=pk).update(**_shifted(deltas))
+
+
+def bump_many(model, pks, **deltas):
+    """Shifts counters of many rows by the same deltas in one UPDATE."""
+    return model.objects.filter(pk__in=pks).update(**_shifted(deltas))
+
+
+def bump_user(user_id, **deltas):
+    UserStats = django_apps.get_model('posts', 'UserStats')
+    if bump(UserStats, user_id, **deltas) or min(deltas.values()) < 0:
+        return
+    # Нет строки счётчиков (например, после bulk_create): создаём её.
+    # При удалении пользователя строку не воскрешаем.
+    UserStats.objects.get_or_create(user_id=user_id)
+    bump(UserStats, user_id, **deltas)
+
+
+def bump_users(user_ids, **deltas):
+    """bump_user() of many users: one UPDATE while their rows exist."""
+    UserStats = django_apps.get_model('posts', 'UserStats')
+    user_ids = set(user_ids)
+    bumped = bump_many(UserStats, user_ids, **deltas)
+    if bumped == len(user_ids) or min(deltas.values()) < 0:
+        return
+    missing = user_ids - set(
+        UserStats.objects.filter(
+            pk__in=user_ids
+        ).values_list('pk', flat=True)
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing],
+        ignore_conflicts=True
+    )
+    bump_many(UserStats, missing, **deltas)
@@ -0,0 +1,187 @@
+"""
+Materialized follow feed.
+
+New posts are pushed into the followers' FeedEntry rows (fan-out on
+write), so reading /follow/ is a range scan over the reader's own rows.
+Authors with FEED_FANOUT_THRESHOLD followers or more are not fanned out:
+their posts are merged into the page at read time (fan-out on read).
+An author who drops below the threshold stops being merged, so the
+followers' feeds get the author's latest posts copied in at that
+moment (demoted()).
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import graph
+from .models import FeedEntry, Follow, Post, UserStats
+from .paginator import NEXT, CursorPaginator, keyset
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.FEED_FANOUT_THRESHOLD
+    ).exists()
+
+
+def celebrity_ids(user):
+    """
+    Followed authors whose posts are merged into the feed on read,
+    among the cached followed authors (posts/graph.py).
+    """
+    followed = graph.following(user.id)
+    if not followed:
+        return []
+    return list(
+        UserStats.objects.filter(
+            user_id__in=list(followed),
+            followers_count__gte=settings.FEED_FANOUT_THRESHOLD
+        ).values_list('user_id', flat=True)
+    )
+
+
+def fan_out(post):
+    """Pushes a new post into the feeds of its author's followers."""
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date
+            )
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True
+    )
+
+
+def backfill_many(user_id, author_ids):
+    """
+    Copies the latest FEED_BACKFILL_LIMIT posts of newly followed
+    authors, celebrities excepted, in one INSERT ... SELECT.
+    """
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {FeedEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT %s, post.id, post.author_id, post.pub_date '
+            'FROM (SELECT id, author_id, pub_date, row_number() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {Post._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})) AS post '
+            f'JOIN {UserStats._meta.db_table} AS stats '
+            'ON stats.user_id = post.author_id '
+            'WHERE stats.followers_count < %s AND post.position <= %s',
+            [
+                user_id, *author_ids,
+                settings.FEED_FANOUT_THRESHOLD, settings.FEED_BACKFILL_LIMIT
+            ]
+        )
+
+
+def demoted(author_ids):
+    """
+    Copies the latest FEED_BACKFILL_LIMIT posts of the authors that
+    have just dropped below FEED_FANOUT_THRESHOLD into the feeds of all
+    their followers, in one INSERT ... SELECT. Their posts written as
+    celebrities were never fanned out and are no longer merged on read.
+    Runs after the followers counters went down by one.
+    """
+    demoted_ids = list(UserStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count=settings.FEED_FANOUT_THRESHOLD - 1
+    ).values_list('user_id', flat=True))
+    if not demoted_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(demoted_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {FeedEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} AS follow '
+            'JOIN (SELECT id, author_id, pub_date, row_number() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {Post._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})) AS post '
+            'ON post.author_id = follow.author_id '
+            'WHERE post.position <= %s',
+            [*demoted_ids, settings.FEED_BACKFILL_LIMIT]
+        )
+
+
+def trim_many(user_id, author_ids):
+    """Removes unfollowed authors' posts from the feed in one DELETE."""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def rebuild():
+    """
+    Refills every feed from the follows in one statement: the latest
+    FEED_BACKFILL_LIMIT posts of each followed author, celebrities
+    excepted. For data loaded around the signals, after recount().
+    """
+    entries = FeedEntry._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {entries}')
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} AS follow '
+            f'JOIN {UserStats._meta.db_table} AS stats '
+            'ON stats.user_id = follow.author_id '
+            'JOIN (SELECT id, author_id, pub_date, row_number() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {Post._meta.db_table}) AS post '
+            'ON post.author_id = follow.author_id '
+            'WHERE stats.followers_count < %s AND post.position <= %s '
+            # Записи по порядку индекса ленты: вставка без разбросанных
+            # по всему дереву страниц.
+            'ORDER BY follow.user_id, post.pub_date DESC, post.id DESC',
+            [settings.FEED_FANOUT_THRESHOLD, settings.FEED_BACKFILL_LIMIT]
+        )
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """
+    Cursor pages of the user's materialized feed merged with the posts
+    of followed celebrities. Numbered pages (?page=N) still fall back
+    to the join over Follow passed in as object_list.
+    """
+
+    def __init__(self, object_list, per_page, user, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def fetch(self, direction, pub_date, post_id, limit):
+        entries = keyset(
+            FeedEntry.objects.filter(user=self.user).select_related(
+                'post__author', 'post__group'
+            ),
+            direction, pub_date, post_id, id_field='post_id'
+        )
+        posts = [entry.post for entry in entries[:limit]]
+        celebrities = celebrity_ids(self.user)
+        if not celebrities:
+            return posts
+        posts += keyset(
+            Post.objects.filter(
+                author_id__in=celebrities
+            ).select_related('author', 'group'),
+            direction, pub_date, post_id
+        )[:limit]
+        merged = {post.id: post for post in posts}.values()
+        return sorted(
+            merged,
+            key=lambda post: (post.pub_date, post.id),
+            reverse=direction == NEXT
+        )[:limit]
@@ -0,0 +1,100 @@
+"""
+Follows and unfollows, one or many at once.
+
+followed() and unfollowed() are everything a follow changes besides
+its row: the counters on both sides, the follow feed, the suggestions,
+the trending scores and the cache scopes. The Follow signals call them
+for the row saved or deleted by profile_follow and profile_unfollow;
+follow_many() and unfollow_many() write the rows of a whole list in
+one statement and call them once for the list. Either way the work is
+a fixed number of statements, and both paths share it. Everything
+runs inside the caller's transaction.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from . import cache, feed, graph, suggestions, trending
+from .counters import bump_users
+from .models import Follow
+
+User = get_user_model()
+
+
+def authors(usernames):
+    """Ids of the existing users by username, in one IN query."""
+    return dict(
+        User.objects.filter(username__in=set(usernames))
+        .values_list('username', 'id')
+    )
+
+
+def followed(user_id, author_ids):
+    """Side effects of new follows of the user."""
+    bump_users(author_ids, followers_count=1)
+    bump_users([user_id], following_count=len(author_ids))
+    feed.backfill_many(user_id, author_ids)
+    suggestions.drop(user_id, set(author_ids))
+    trending.followed(author_ids)
+    cache.invalidate(
+        graph.scope(user_id),
+        *(f'followers:{author_id}' for author_id in author_ids)
+    )
+
+
+def unfollowed(user_id, author_ids):
+    """Side effects of removed follows of the user."""
+    bump_users(author_ids, followers_count=-1)
+    bump_users([user_id], following_count=-len(author_ids))
+    feed.trim_many(user_id, author_ids)
+    feed.demoted(author_ids)
+    cache.invalidate(
+        graph.scope(user_id),
+        *(f'followers:{author_id}' for author_id in author_ids)
+    )
+
+
+def follow_many(user_id, author_ids):
+    """Follows the authors; returns the ids that were not followed yet."""
+    author_ids = set(author_ids) - {user_id}
+    already = Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).values_list('author_id', flat=True)
+    new = sorted(author_ids - set(already))
+    if not new:
+        return []
+    # bulk_create не шлёт post_save: последствия — одним вызовом ниже.
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id) for author_id in new],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    followed(user_id, new)
+    return new
+
+
+def unfollow_many(user_id, author_ids):
+    """Unfollows the authors; returns the ids that were followed."""
+    gone = sorted(Follow.objects.filter(
+        user_id=user_id, author_id__in=set(author_ids)
+    ).values_list('author_id', flat=True))
+    if not gone:
+        return []
+    # Один DELETE без post_delete на каждую строку: последствия для
+    # всего списка — одним вызовом ниже.
+    placeholders = ', '.join(['%s'] * len(gone))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {Follow._meta.db_table} '
+            f'WHERE user_id = %s AND author_id IN ({placeholders})',
+            [user_id, *gone]
+        )
+    unfollowed(user_id, gone)
+    return gone
+
+
+def apply(user_id, follow_ids, unfollow_ids):
+    """Both at once: (followed ids, unfollowed ids)."""
+    return (
+        follow_many(user_id, follow_ids),
+        unfollow_many(user_id, unfollow_ids)
+    )
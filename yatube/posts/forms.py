@@ -1,6 +1,13 @@
 from django import forms
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 
-from .models import Post, Comment
+from . import thumbnails
+from .models import Comment, Group, Post
+from .uploads import process_image
+
+User = get_user_model()
 
 
 class PostForm(forms.ModelForm):
@@ -14,6 +21,18 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('Напишите что-нибудь!')
         return text
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return process_image(image)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and 'image' in self.changed_data and post.image:
+            transaction.on_commit(lambda: thumbnails.enqueue(post))
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -35,3 +54,24 @@ class CommentForm(forms.ModelForm):
             if word in bold_text.split():
                 raise forms.ValidationError('Ругаться нехорошо!')
         return text
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Что ищем', required=False, max_length=200)
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        label='Группа',
+        empty_label='Все группы'
+    )
+    author = forms.CharField(label='Автор', required=False, max_length=150)
+
+    def clean_author(self):
+        username = self.cleaned_data.get('author')
+        if not username:
+            return None
+        author = User.objects.filter(username=username).only('id').first()
+        if author is None:
+            raise forms.ValidationError('Нет такого автора.')
+        return author
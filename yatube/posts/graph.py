@@ -0,0 +1,67 @@
+"""
+Adjacency cache of the follow graph: the authors each user follows.
+
+The list of a user is a sorted array of author ids, loaded lazily with
+one query. It is kept in the shared cache under the generation of the
+user's 'following:<id>' scope, so every process reuses it, and in an
+LRU of FOLLOW_GRAPH_LOCAL_SIZE lists in this process, so a warm "am I
+following X" is a generation read and a binary search. Follows and
+unfollows bump the scope (posts.signals, posts.follows), again after
+their commit (posts/cache.py), and the next read loads the list again:
+a list read before the commit is never served under the new generation.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+
+from . import cache
+from .models import Follow
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def scope(user_id):
+    return f'following:{user_id}'
+
+
+def _load(user_id, generation):
+    key = f'posts:following:{user_id}:{generation}'
+    data = shared_cache.get(key)
+    ids = array('q')
+    if data is not None:
+        ids.frombytes(data)
+        return ids
+    ids.extend(
+        Follow.objects.filter(user_id=user_id).order_by('author_id')
+        .values_list('author_id', flat=True)
+    )
+    shared_cache.set(key, ids.tobytes(), settings.FEED_CACHE_TIMEOUT)
+    return ids
+
+
+def following(user_id):
+    """Sorted array of the ids of the authors the user follows."""
+    generation, = cache.generations(scope(user_id))
+    with _lock:
+        local = _local.get(user_id)
+        if local is not None and local[0] == generation:
+            _local.move_to_end(user_id)
+            return local[1]
+    ids = _load(user_id, generation)
+    with _lock:
+        _local[user_id] = (generation, ids)
+        _local.move_to_end(user_id)
+        while len(_local) > settings.FOLLOW_GRAPH_LOCAL_SIZE:
+            _local.popitem(last=False)
+    return ids
+
+
+def is_following(user_id, author_id):
+    ids = following(user_id)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
@@ -0,0 +1,114 @@
+"""
+Per-reader holes of the cached pages.
+
+The full-page cache (posts/conditional.py) renders a page once, for an
+anonymous reader, with a marker in place of every fragment that
+depends on who reads it: the user menu, the feed switcher, the follow
+button, the suggested authors, the post actions. Serving the page
+renders only these small fragments for the current reader, so
+signed-in readers share the cached page with everyone else.
+
+A hole is a function of the request and the plain values the page
+passed to `{% hole %}`; the values go into the marker as JSON.
+"""
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import graph, suggestions
+from .forms import CommentForm
+
+HOLES = {}
+MARKER = re.compile(r'<!--hole (\[.*?\])-->')
+
+
+def hole(function):
+    HOLES[function.__name__] = function
+    return function
+
+
+def render_hole(request, name, args):
+    return mark_safe(HOLES[name](request, *args))
+
+
+def marker(name, args):
+    # Пользовательский текст на странице экранирован: подделать
+    # маркер в посте или комментарии нельзя.
+    return mark_safe(
+        f'<!--hole {json.dumps([name, *args], ensure_ascii=False)}-->'
+    )
+
+
+def split(html):
+    """Page with markers as a list: text, (name, args), text, ..."""
+    parts = MARKER.split(html)
+    for index in range(1, len(parts), 2):
+        name, *args = json.loads(parts[index])
+        parts[index] = (name, args)
+    return parts
+
+
+def fill(request, parts):
+    """The page for the reader: holes rendered in place of the markers."""
+    return ''.join(
+        part if index % 2 == 0 else render_hole(request, *part)
+        for index, part in enumerate(parts)
+    )
+
+
+def _user(request):
+    return getattr(request, 'user', None)
+
+
+@hole
+def user_menu(request):
+    return render_to_string('includes/user_menu.html', request=request)
+
+
+@hole
+def feed_switcher(request, active):
+    return render_to_string(
+        'posts/includes/switcher.html', {'active': active}, request=request
+    )
+
+
+@hole
+def follow_button(request, author_id, username):
+    """Follow or unfollow link, checked in the cached followed authors."""
+    user = _user(request)
+    if user is None or not user.is_authenticated or user.id == author_id:
+        return ''
+    following = graph.is_following(user.id, author_id)
+    return render_to_string('posts/includes/follow_button.html', {
+        'username': username, 'following': following,
+    })
+
+
+@hole
+def follow_suggestions(request):
+    """
+    Authors to follow, from the cache of posts.suggestions: no queries
+    unless the cache lost them.
+    """
+    user = _user(request)
+    if user is None or not user.is_authenticated:
+        return ''
+    authors = suggestions.cached(user.id)
+    if not authors:
+        return ''
+    return render_to_string('posts/includes/suggestions.html', {
+        'authors': authors,
+    })
+
+
+@hole
+def post_actions(request, post_id, author_id):
+    """Edit link for the author, comment form for signed-in readers."""
+    user = _user(request)
+    return render_to_string('posts/includes/post_actions.html', {
+        'post_id': post_id,
+        'is_author': user is not None and user.id == author_id,
+        'form': CommentForm(),
+    }, request=request)
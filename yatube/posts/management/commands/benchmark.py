@@ -0,0 +1,509 @@
+import http.client
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from importlib import import_module
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.stats import percentile
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import CommentPaginator
+from posts.search import TERM
+from yatube.settings import COMMENTS_ON_PAGE
+
+User = get_user_model()
+
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+PERCENTILES = (50, 95, 99)
+# Сравниваются с базовым замером; p99 на десятках запросов слишком шумный.
+COMPARED_LATENCIES = ('p50_ms', 'p95_ms')
+COMPARED_SIZES = ('bytes', 'peak_memory_bytes')
+# Пик памяти небольших страниц гуляет на десятки килобайт.
+MIN_MEMORY_DELTA = 64 * 1024
+HOST = '127.0.0.1'
+COMMENT_TEXT = 'Комментарий замера производительности'
+
+# Кто запрашивает страницу.
+ANONYMOUS, READER, AUTHOR = 'anonymous', 'reader', 'author'
+
+# data задаёт POST-запрос.
+Route = namedtuple('Route', 'role url data', defaults=(None,))
+
+
+def route_names():
+    """Names of every route of the benchmarked urlconfs."""
+    names = []
+    for urlconf in URLCONFS:
+        module = import_module(urlconf)
+        names += [
+            f'{module.app_name}:{pattern.name}'
+            for pattern in module.urlpatterns
+        ]
+    return names
+
+
+def percentiles(timings):
+    return {f'p{p}_ms': percentile(timings, p) for p in PERCENTILES}
+
+
+def compare(baseline, current, threshold, min_delta):
+    """
+    Regressions of current results against baseline ones: latency or
+    size grown by more than threshold (and latency by min_delta ms),
+    any extra query, a changed status.
+    """
+    regressions = []
+    for name, now in current['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        if now['status'] != before['status']:
+            regressions.append(
+                f'{name}: статус {before["status"]} → {now["status"]}'
+            )
+        if now['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: запросов {before["queries"]} → {now["queries"]}'
+            )
+        for metric in COMPARED_LATENCIES + COMPARED_SIZES:
+            limit = before[metric] * (1 + threshold)
+            if metric in COMPARED_LATENCIES:
+                limit = max(limit, before[metric] + min_delta)
+            elif metric == 'peak_memory_bytes':
+                limit = max(limit, before[metric] + MIN_MEMORY_DELTA)
+            if now[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {before[metric]:.2f} → '
+                    f'{now[metric]:.2f}'
+                )
+    return regressions
+
+
+class ClientSession:
+    """Requests of one visitor through the Django test client."""
+
+    def __init__(self, user=None):
+        self.client = Client(HTTP_HOST=HOST)
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, route):
+        if route.data is None:
+            response = self.client.get(route.url)
+        else:
+            response = self.client.post(route.url, route.data)
+        return response.status_code, len(response.content)
+
+    def close(self):
+        self.client.logout()
+
+
+class HttpSession(ClientSession):
+    """The same visitor over HTTP to a local WSGI server."""
+
+    def __init__(self, address, user=None):
+        super().__init__(user)
+        self.address = address
+
+    def send(self, method, url, body=None, headers=None):
+        headers = dict(headers or {})
+        cookies = self.client.cookies
+        if cookies:
+            headers['Cookie'] = '; '.join(
+                f'{key}={morsel.value}' for key, morsel in cookies.items()
+            )
+        server = http.client.HTTPConnection(*self.address)
+        try:
+            server.request(method, url, body, headers)
+            response = server.getresponse()
+            content = response.read()
+        finally:
+            server.close()
+        for header in response.msg.get_all('Set-Cookie') or ():
+            cookies.load(header)
+        return response.status, content
+
+    def request(self, route):
+        if route.data is None:
+            status, content = self.send('GET', route.url)
+            return status, len(content)
+        if settings.CSRF_COOKIE_NAME not in self.client.cookies:
+            # Токен ставит любая страница с формой.
+            self.send('GET', reverse('posts:create_post'))
+        data = dict(route.data)
+        data['csrfmiddlewaretoken'] = (
+            self.client.cookies[settings.CSRF_COOKIE_NAME].value
+        )
+        status, content = self.send(
+            'POST', route.url, urlencode(data),
+            {'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+        return status, len(content)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет все страницы posts, users и about на текущей базе '
+        '(заполните её командой seed): p50/p95/p99 задержки, запросы '
+        'к БД, размер ответа и пик памяти. Пишет JSON и сравнивает '
+        'его с базовым замером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Замеряемых запросов к каждой странице.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Незамеряемых запросов перед замером.'
+        )
+        parser.add_argument(
+            '--transport', choices=('client', 'wsgi'), default='client',
+            help='Тестовый клиент Django или HTTP к локальному '
+                 'WSGI-серверу.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help='Замерить только эту страницу (можно повторять).'
+        )
+        parser.add_argument('--output', help='Куда записать JSON.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого замера для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый относительный рост метрик.'
+        )
+        parser.add_argument(
+            '--min-delta', type=float, default=1.0,
+            help='Рост задержки меньше стольких мс не считается.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        baseline = self.load_baseline()
+        routes = self.routes()
+        server = None
+        if options['transport'] == 'wsgi':
+            server = make_server(
+                HOST, 0, get_wsgi_application(), handler_class=QuietHandler
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            results = self.run(routes, server)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            # Комментарии замера не остаются в базе.
+            for comment in Comment.objects.filter(text=COMMENT_TEXT):
+                comment.delete()
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if baseline is not None:
+            self.check_regressions(baseline, results)
+
+    def targets(self):
+        """The heaviest objects of the database: worst-case pages."""
+        post = (
+            Post.objects.select_related('author')
+            .order_by('-comments_count', '-id').first()
+        )
+        group = Group.objects.order_by('-posts_count', 'id').first()
+        if post is None or group is None:
+            raise CommandError(
+                'Нет постов или групп: заполните базу командой seed.'
+            )
+        reader_id = (
+            Follow.objects.values('user').annotate(total=Count('id'))
+            .order_by('-total').values_list('user', flat=True).first()
+        )
+        reader = (
+            User.objects.get(id=reader_id) if reader_id is not None
+            else User.objects.exclude(id=post.author_id).first()
+        )
+        # Читатель подписывается на него и тут же отписывается.
+        followed = reader and (
+            User.objects.exclude(following__user=reader).exclude(id=reader.id)
+            .order_by('-stats__followers_count', 'id').first()
+        )
+        if followed is None:
+            raise CommandError('Нужны хотя бы два пользователя.')
+        words = TERM.findall(post.text)
+        # Вторая порция комментариев: её подгружает post_detail.
+        comments = CommentPaginator(post.comments.all(), COMMENTS_ON_PAGE)
+        comments.cursor_page()
+        return {
+            'post': post,
+            'group': group,
+            'author': post.author,
+            'reader': reader,
+            'followed': followed,
+            'query': words[0] if words else post.text,
+            'comments_cursor': comments.next_cursor or '',
+        }
+
+    def routes(self):
+        targets = self.targets()
+        post_id = targets['post'].id
+        routes = {
+            'posts:group_list': Route(ANONYMOUS, reverse(
+                'posts:group_list', args=[targets['group'].slug]
+            )),
+            'posts:index': Route(ANONYMOUS, reverse('posts:index')),
+            'posts:create_post': Route(READER, reverse('posts:create_post')),
+            'posts:follow_index': Route(READER, reverse('posts:follow_index')),
+            'posts:trending': Route(ANONYMOUS, reverse('posts:trending')),
+            'posts:hot_groups': Route(ANONYMOUS, reverse('posts:hot_groups')),
+            'posts:search': Route(
+                ANONYMOUS,
+                f'{reverse("posts:search")}?'
+                f'{urlencode({"q": targets["query"]})}'
+            ),
+            'posts:profile': Route(ANONYMOUS, reverse(
+                'posts:profile', args=[targets['author'].username]
+            )),
+            'posts:profile_follow': Route(READER, reverse(
+                'posts:profile_follow', args=[targets['followed'].username]
+            )),
+            'posts:profile_unfollow': Route(READER, reverse(
+                'posts:profile_unfollow', args=[targets['followed'].username]
+            )),
+            'posts:post_detail': Route(
+                ANONYMOUS, reverse('posts:post_detail', args=[post_id])
+            ),
+            'posts:post_comments': Route(
+                ANONYMOUS,
+                f'{reverse("posts:post_comments", args=[post_id])}?'
+                f'{urlencode({"cursor": targets["comments_cursor"]})}'
+            ),
+            'posts:post_edit': Route(
+                AUTHOR, reverse('posts:post_edit', args=[post_id])
+            ),
+            'posts:add_comment': Route(
+                READER, reverse('posts:add_comment', args=[post_id]),
+                {'text': COMMENT_TEXT}
+            ),
+            'posts:api_index': Route(ANONYMOUS, reverse('posts:api_index')),
+            'posts:api_group': Route(ANONYMOUS, reverse(
+                'posts:api_group', args=[targets['group'].slug]
+            )),
+            'posts:api_profile': Route(ANONYMOUS, reverse(
+                'posts:api_profile', args=[targets['author'].username]
+            )),
+            'posts:api_follow': Route(READER, reverse('posts:api_follow')),
+            # Подписка и отписка в одном запросе: граф подписок цел.
+            'posts:api_follow_batch': Route(
+                READER, reverse('posts:api_follow_batch'), {
+                    'follow': targets['followed'].username,
+                    'unfollow': targets['followed'].username,
+                }
+            ),
+            'posts:api_post': Route(
+                ANONYMOUS, reverse('posts:api_post', args=[post_id])
+            ),
+            'posts:api_comments': Route(
+                ANONYMOUS, reverse('posts:api_comments', args=[post_id])
+            ),
+            'users:login': Route(ANONYMOUS, reverse('users:login')),
+            # Выход анонима не завершает сессии читателя и автора.
+            'users:logout': Route(ANONYMOUS, reverse('users:logout')),
+            'users:password_change': Route(
+                READER, reverse('users:password_change')
+            ),
+            'users:password_change_done': Route(
+                READER, reverse('users:password_change_done')
+            ),
+            'users:password_reset_form': Route(
+                ANONYMOUS, reverse('users:password_reset_form')
+            ),
+            'users:signup': Route(ANONYMOUS, reverse('users:signup')),
+            'about:author': Route(ANONYMOUS, reverse('about:author')),
+            'about:tech': Route(ANONYMOUS, reverse('about:tech')),
+        }
+        missing = set(route_names()) - set(routes)
+        if missing:
+            raise CommandError(
+                f'Не описаны страницы: {", ".join(sorted(missing))}.'
+            )
+        selected = self.options['routes']
+        if selected:
+            unknown = set(selected) - set(routes)
+            if unknown:
+                raise CommandError(
+                    f'Нет таких страниц: {", ".join(sorted(unknown))}.'
+                )
+            routes = {name: routes[name] for name in selected}
+        self.targets_meta = {
+            role: targets[role].username for role in (READER, AUTHOR)
+        }
+        self.users = {
+            ANONYMOUS: None, READER: targets['reader'],
+            AUTHOR: targets['author'],
+        }
+        return routes
+
+    def sessions(self, server):
+        if server is None:
+            return {role: ClientSession(user)
+                    for role, user in self.users.items()}
+        return {role: HttpSession(server.server_address, user)
+                for role, user in self.users.items()}
+
+    def run(self, routes, server):
+        options = self.options
+        sessions = self.sessions(server)
+        profilers = {
+            role: ClientSession(user) for role, user in self.users.items()
+        }
+        timings = {name: [] for name in routes}
+        responses = {}
+        try:
+            # По кругу: подписка и отписка чередуются, а шум машины
+            # делится между страницами поровну.
+            for round_number in range(options['warmup'] + options['requests']):
+                for name, route in routes.items():
+                    if options['cold']:
+                        cache.clear()
+                    started = time.perf_counter()
+                    responses[name] = sessions[route.role].request(route)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if round_number >= options['warmup']:
+                        timings[name].append(elapsed)
+            profiles = {
+                name: self.profile(profilers[route.role], route)
+                for name, route in routes.items()
+            }
+        finally:
+            for session in (*sessions.values(), *profilers.values()):
+                session.close()
+        return {
+            'meta': self.meta(),
+            'routes': {
+                name: {
+                    'url': route.url,
+                    'method': 'GET' if route.data is None else 'POST',
+                    'role': route.role,
+                    'status': responses[name][0],
+                    **percentiles(timings[name]),
+                    'mean_ms': statistics.mean(timings[name]),
+                    'bytes': responses[name][1],
+                    **profiles[name],
+                }
+                for name, route in routes.items()
+            },
+        }
+
+    def profile(self, session, route):
+        """Queries and peak Python memory of one more request."""
+        if self.options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                session.request(route)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {'queries': len(queries), 'peak_memory_bytes': peak}
+
+    def meta(self):
+        options = self.options
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'transport': options['transport'],
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'cold': options['cold'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'users': self.targets_meta,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"страница":<28} {"код":>4} {"p50":>8} {"p95":>8} '
+            f'{"p99":>8} {"запр.":>5} {"КБ":>7} {"пик КБ":>8}'
+        )
+        for name, result in results['routes'].items():
+            self.stdout.write(
+                f'{name:<28} {result["status"]:>4} '
+                f'{result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+                f'{result["p99_ms"]:>8.2f} {result["queries"]:>5} '
+                f'{result["bytes"] / 1024:>7.1f} '
+                f'{result["peak_memory_bytes"] / 1024:>8.1f}'
+            )
+
+    def load_baseline(self):
+        if not self.options['baseline']:
+            return None
+        with open(self.options['baseline'], encoding='utf-8') as baseline:
+            baseline = json.load(baseline)
+        # Сравнимы только замеры одного режима.
+        for key in ('transport', 'cold'):
+            if baseline['meta'][key] != self.options[key]:
+                raise CommandError(
+                    f'Базовый замер сделан с другим {key}: '
+                    f'{baseline["meta"][key]}.'
+                )
+        return baseline
+
+    def check_regressions(self, baseline, results):
+        regressions = compare(
+            baseline, results,
+            self.options['threshold'], self.options['min_delta']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базового замера:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно базового замера нет.'
+        ))
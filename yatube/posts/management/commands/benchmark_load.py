@@ -0,0 +1,227 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.backends.sqlite3 import base
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.management.commands.benchmark import (
+    COMMENT_TEXT, HOST, percentiles
+)
+from core.sqlite3.base import DatabaseWrapper
+from posts.models import Comment, Follow, Post, User
+
+# Настройки SQLite до core/sqlite3: журнал отката, fsync на каждый
+# коммит, соединение на запрос, отложенный BEGIN, без повторов.
+UNTUNED_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+POST_TEXT = 'Пост замера производительности'
+# Среди скольких авторов выбирать подписки сценария follows.
+AUTHORS = 50
+
+
+def untune():
+    settings.SQLITE_PRAGMAS = UNTUNED_PRAGMAS
+    settings.DATABASE_LOCK_RETRIES = 0
+    DatabaseWrapper._start_transaction_under_autocommit = (
+        base.DatabaseWrapper._start_transaction_under_autocommit
+    )
+    for alias in connections:
+        connections[alias].settings_dict['CONN_MAX_AGE'] = 0
+
+
+def actions(options, author_names):
+    """Requests of the scenario: name, method, url, data."""
+    if options['scenario'] == 'comments':
+        return lambda rng, post_id: (
+            'comment', 'post',
+            reverse('posts:add_comment', args=[post_id]),
+            {'text': COMMENT_TEXT}
+        )
+
+    def write(rng, post_id):
+        username = rng.choice(author_names)
+        kind = rng.choice(('follow', 'unfollow', 'post'))
+        if kind == 'post':
+            return (
+                kind, 'post', reverse('posts:create_post'),
+                {'text': POST_TEXT}
+            )
+        return (
+            kind, 'get',
+            reverse(f'posts:profile_{kind}', args=[username]), None
+        )
+    return write
+
+
+def worker(number, options, post_ids, author_names, cookies, results):
+    """
+    One server process: reads post pages, sometimes writes. Counts the
+    queries and transactions of every request.
+    """
+    if options['untuned']:
+        untune()
+    rng = random.Random(number)
+    client = Client(HTTP_HOST=HOST)
+    client.cookies = cookies
+    write = actions(options, author_names)
+    stats = {}
+    errors = 0
+    try:
+        for _ in range(options['requests']):
+            post_id = rng.choice(post_ids)
+            if rng.random() < options['writes']:
+                kind, method, url, data = write(rng, post_id)
+            else:
+                kind, method, url, data = 'read', 'get', reverse(
+                    'posts:post_detail', args=[post_id]
+                ), None
+            started = time.perf_counter()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method)(url, data)
+                failed = response.status_code >= 500
+            except OperationalError:
+                failed = True
+            elapsed = (time.perf_counter() - started) * 1000
+            if failed:
+                errors += 1
+                continue
+            kind_stats = stats.setdefault(
+                kind, {'timings': [], 'queries': 0, 'transactions': 0}
+            )
+            kind_stats['timings'].append(elapsed)
+            kind_stats['queries'] += len(queries)
+            kind_stats['transactions'] += sum(
+                query['sql'].startswith('BEGIN') for query in queries
+            )
+    finally:
+        # Родитель ждёт итог каждого процесса, даже упавшего.
+        results.put((stats, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка на текущую базу: несколько процессов '
+        'читают страницы постов и пишут одновременно: комментарии '
+        'или подписки, отписки и новые посты. Печатает p50/p95/p99, '
+        'запросы и транзакции на действие и число ошибок '
+        '«database is locked».'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Параллельных процессов.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Запросов каждого процесса.'
+        )
+        parser.add_argument(
+            '--writes', type=float, default=0.2,
+            help='Доля запросов-записей.'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=500,
+            help='Среди скольких свежих постов выбирать.'
+        )
+        parser.add_argument(
+            '--scenario', choices=('comments', 'follows'),
+            default='comments',
+            help='Какие записи: комментарии или подписки, отписки и посты.'
+        )
+        parser.add_argument(
+            '--untuned', action='store_true',
+            help='Без PRAGMA, постоянных соединений и повторов: '
+                 'базовый замер.'
+        )
+
+    def handle(self, *args, **options):
+        post_ids = list(
+            Post.objects.order_by('-pub_date')
+            .values_list('id', flat=True)[:options['posts']]
+        )
+        reader = User.objects.order_by('id').first()
+        if not post_ids or reader is None:
+            raise CommandError(
+                'Нет постов: заполните базу командой seed.'
+            )
+        # Подписки сценария follows — на тех, на кого читатель не подписан.
+        author_names = list(
+            User.objects.exclude(id=reader.id)
+            .exclude(following__user=reader).order_by('id')
+            .values_list('username', flat=True)[:AUTHORS]
+        )
+        cache.clear()
+        # Вход один, до запуска: процессы делят его сессию.
+        client = Client(HTTP_HOST=HOST)
+        client.force_login(reader)
+        # Процессы открывают свои соединения, не копию родительского.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=worker,
+                args=(
+                    number, options, post_ids, author_names,
+                    client.cookies, results
+                )
+            )
+            for number in range(options['workers'])
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        stats = {}
+        errors = 0
+        for _ in processes:
+            worker_stats, worker_errors = results.get()
+            for kind, values in worker_stats.items():
+                kind_stats = stats.setdefault(
+                    kind, {'timings': [], 'queries': 0, 'transactions': 0}
+                )
+                kind_stats['timings'] += values['timings']
+                kind_stats['queries'] += values['queries']
+                kind_stats['transactions'] += values['transactions']
+            errors += worker_errors
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        # Записи замера не остаются в базе.
+        for comment in Comment.objects.filter(text=COMMENT_TEXT):
+            comment.delete()
+        for post in Post.objects.filter(text=POST_TEXT):
+            post.delete()
+        for follow in Follow.objects.filter(
+            user=reader, author__username__in=author_names
+        ):
+            follow.delete()
+        self.report(stats, errors, elapsed)
+
+    def report(self, stats, errors, elapsed):
+        self.stdout.write(
+            f'{"запросы":<8} {"число":>6} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"SQL":>6} {"BEGIN":>6}'
+        )
+        for kind, values in sorted(stats.items()):
+            count = len(values['timings'])
+            cuts = percentiles(values['timings'])
+            self.stdout.write(
+                f'{kind:<8} {count:>6} {cuts["p50_ms"]:>8.2f} '
+                f'{cuts["p95_ms"]:>8.2f} {cuts["p99_ms"]:>8.2f} '
+                f'{values["queries"] / count:>6.1f} '
+                f'{values["transactions"] / count:>6.2f}'
+            )
+        total = sum(
+            len(values['timings']) for values in stats.values()
+        ) + errors
+        self.stdout.write(
+            f'ошибок: {errors}, {total / elapsed:.0f} запросов в секунду'
+        )
@@ -0,0 +1,155 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.counters import recount
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.paginator import NEXT, keyset
+from yatube.settings import NUM_POSTS_ON_PAGE
+
+User = get_user_model()
+
+# Индексы миграции 0010: с флагом --compare снимаются на время замера.
+FEED_INDEXES = (
+    'post_feed_idx',
+    'post_author_feed_idx',
+    'post_group_feed_idx',
+    'comment_post_idx',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время запросов всех лент. '
+        'С --compare сравнивает их с планами без индексов лент.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=0,
+            help='Досоздать постов до этого числа перед замером.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнить каждый запрос.'
+        )
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Повторить замер без индексов лент (в откатываемой '
+                 'транзакции).'
+        )
+
+    def handle(self, *args, **options):
+        if Post.objects.count() < options['posts']:
+            self.top_up(options['posts'])
+        queries = self.feed_queries()
+        if not queries:
+            self.stderr.write('Нет постов: запустите с --posts N.')
+            return
+        self.report('С индексами лент', queries, options['repeat'])
+        if options['compare']:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for index in FEED_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{index}"')
+                self.report('Без индексов лент', queries, options['repeat'])
+                transaction.set_rollback(True)
+
+    def top_up(self, total, batch_size=5000):
+        """Bulk-creates plain posts spread over a few authors and groups."""
+        authors = list(User.objects.all()[:100]) or [
+            User.objects.create_user(username=f'bench_author_{i}')
+            for i in range(100)
+        ]
+        groups = list(Group.objects.all()[:20]) or [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'bench-group-{i}', description='-'
+            )
+            for i in range(20)
+        ]
+        missing = total - Post.objects.count()
+        while missing > 0:
+            size = min(batch_size, missing)
+            Post.objects.bulk_create(
+                [
+                    Post(
+                        text='Тестовый пост',
+                        author=random.choice(authors),
+                        group=random.choice(groups + [None])
+                    )
+                    for _ in range(size)
+                ],
+                batch_size=500
+            )
+            missing -= size
+            self.stdout.write(f'Осталось создать постов: {missing}')
+        recount()
+
+    def feed_queries(self):
+        """Query of every feed shape, built the way the views build it."""
+        total = Post.objects.count()
+        if not total:
+            return {}
+        limit = NUM_POSTS_ON_PAGE + 1
+        deep = Post.objects.order_by('-pub_date', '-id')[total * 9 // 10]
+        post = Post.objects.order_by('-comments_count').first()
+        author_id = post.author_id
+        group_id = (
+            Post.objects.exclude(group=None)
+            .values_list('group_id', flat=True).first()
+        )
+        follow = Follow.objects.first()
+        reader_id = follow.user_id if follow else author_id
+        return {
+            'index, первая страница': keyset(
+                Post.objects.all(), NEXT, None, None
+            )[:limit],
+            'index, курсор на 90%': keyset(
+                Post.objects.all(), NEXT, deep.pub_date, deep.id
+            )[:limit],
+            'index, ?page= на 90%': Post.objects.order_by(
+                '-pub_date', '-id'
+            )[total * 9 // 10:total * 9 // 10 + NUM_POSTS_ON_PAGE],
+            'group_list': keyset(
+                Post.objects.filter(group_id=group_id), NEXT, None, None
+            )[:limit],
+            'profile': keyset(
+                Post.objects.filter(author_id=author_id), NEXT, None, None
+            )[:limit],
+            'follow_index': keyset(
+                FeedEntry.objects.filter(user_id=reader_id),
+                NEXT, None, None, id_field='post_id'
+            )[:limit],
+            'проверка подписки': Follow.objects.filter(
+                user_id=reader_id, author_id=author_id
+            )[:1],
+            'комментарии поста': Comment.objects.filter(post=post),
+        }
+
+    def report(self, title, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: медиана {statistics.median(timings):.2f} мс, '
+                f'максимум {max(timings):.2f} мс'
+            ))
+            self.stdout.write(self.plan(queryset, title))
+
+    def plan(self, queryset, tag):
+        if connection.vendor != 'sqlite':
+            return queryset.explain()
+        # Кэш выражений sqlite3 вернул бы план, собранный до DROP INDEX:
+        # делаем текст запроса уникальным для замера.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql} -- {tag}', params)
+            return '\n'.join(' '.join(map(str, row)) for row in cursor)
@@ -0,0 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import remember, render, start_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит миниатюры всех картинок постов сразу, не дожидаясь, '
+        'пока их поставят в очередь открывшие страницы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=settings.POST_THUMBNAIL_WORKERS or 1,
+            help='Процессов в пуле.'
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct().iterator()
+        )
+        rendered = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=start_worker
+        ) as pool:
+            futures = {name: pool.submit(render, name) for name in names}
+            for name, future in futures.items():
+                if future.exception() is None:
+                    remember(name, future.result())
+                    rendered += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'{future.exception()}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово картинок: {rendered}, с ошибками: {failed}.'
+        ))
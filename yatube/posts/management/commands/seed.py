@@ -0,0 +1,308 @@
+import datetime as dt
+import os
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from posts import feed, search, trending
+from posts.counters import recount
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SYLLABLES = (
+    'ба ве ги до жу за ки ло ми на но пе ро са ти ту фа хо це ча ше ща '
+    'ар ен ил ок ут ыр ем ан ост ств про тра кра ско вла при мир дом'
+).split()
+IMAGE_SIZES = ((1920, 1080), (1080, 1350), (1280, 1280), (800, 600))
+
+
+def power_law(size, skew):
+    """Cumulative weights of ranks 1..size falling off as rank ** -skew."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Lets bulk_create keep generated dates instead of now()."""
+    fields = [
+        field for model in models for field in model._meta.fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу данными для замеров: степенное распределение '
+        'подписчиков и активности авторов, популярные группы, посты '
+        'с картинками и без. Один и тот же --seed даёт те же данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=30)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument(
+            '--no-group', type=float, default=0.3,
+            help='Доля постов без группы.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель степенных распределений.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --until разложить посты.'
+        )
+        parser.add_argument(
+            '--until', type=dt.date.fromisoformat,
+            default=timezone.localdate(),
+            help='Дата самого свежего поста, ГГГГ-ММ-ДД.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.started = time.perf_counter()
+        until = timezone.make_aware(
+            dt.datetime.combine(options['until'], dt.time.max)
+        )
+        self.until = until.timestamp()
+        self.since = self.until - options['days'] * 24 * 60 * 60
+
+        user_ids = self.stage('Пользователи', self.create_users)
+        group_ids = self.stage('Группы', self.create_groups)
+        images = self.stage('Картинки', self.create_images)
+        post_ids, post_times = self.stage(
+            'Посты', self.create_posts, user_ids, group_ids, images
+        )
+        self.stage(
+            'Комментарии', self.create_comments, user_ids, post_ids,
+            post_times
+        )
+        self.stage('Подписки', self.create_follows, user_ids)
+        # bulk_create обходит сигналы: всё производное строим заново.
+        self.stage('Счётчики', recount)
+        self.stage('Ленты подписок', feed.rebuild)
+        self.stage('Поисковый индекс', search.rebuild)
+        self.stage('Популярное', trending.rebuild)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - self.started:.1f} с.'
+        ))
+
+    def stage(self, title, step, *args):
+        started = time.perf_counter()
+        result = step(*args)
+        self.stdout.write(
+            f'{title}: {time.perf_counter() - started:.1f} с'
+        )
+        return result
+
+    def batches(self, total):
+        size = self.options['batch_size']
+        for start in range(0, total, size):
+            yield min(size, total - start)
+
+    def skewed(self, population, weights, count):
+        """count picks from population, the first ones the most often."""
+        return self.random.choices(population, cum_weights=weights, k=count)
+
+    def create_users(self):
+        password = make_password(None)
+        User.objects.bulk_create(
+            [
+                User(username=f'seed{i}', password=password)
+                for i in range(self.options['users'])
+            ],
+            ignore_conflicts=True
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith='seed')
+            .order_by('id').values_list('id', flat=True)
+        )
+        # Место в степенном распределении не зависит от id.
+        self.random.shuffle(user_ids)
+        return user_ids
+
+    def create_groups(self):
+        Group.objects.bulk_create(
+            [
+                Group(
+                    title=f'Группа {i}',
+                    slug=f'seed-{i}',
+                    description=self.text(10, 30)
+                )
+                for i in range(self.options['groups'])
+            ],
+            ignore_conflicts=True
+        )
+        return list(
+            Group.objects.filter(slug__startswith='seed-')
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_images(self):
+        """A few real pictures for the posts to share."""
+        folder = os.path.join(
+            settings.MEDIA_ROOT, Post.image.field.upload_to, 'seed'
+        )
+        os.makedirs(folder, exist_ok=True)
+        # Свой генератор: уже нарисованные картинки не сдвигают остальные.
+        pictures = random.Random(f'{self.options["seed"]}-images')
+        names = []
+        for i, size in enumerate(IMAGE_SIZES * 3):
+            name = f'{Post.image.field.upload_to}seed/{i}.jpg'
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                image = Image.new('RGB', size, self.color(pictures))
+                draw = ImageDraw.Draw(image)
+                for _ in range(20):
+                    x, y = (pictures.randrange(side) for side in size)
+                    draw.ellipse(
+                        (x, y, x + size[0] // 4, y + size[1] // 4),
+                        fill=self.color(pictures)
+                    )
+                image.save(path, quality=85)
+            names.append(name)
+        return names
+
+    @staticmethod
+    def color(generator):
+        return tuple(generator.randrange(256) for _ in range(3))
+
+    def text(self, shortest, longest):
+        if not hasattr(self, 'words'):
+            words = set()
+            while len(words) < 5000:
+                words.add(''.join(
+                    self.random.choices(SYLLABLES, k=self.random.randint(1, 4))
+                ))
+            self.words = sorted(words)
+            self.random.shuffle(self.words)
+            self.word_weights = power_law(len(self.words), 1.0)
+        words = self.skewed(
+            self.words, self.word_weights,
+            self.random.randint(shortest, longest)
+        )
+        return ' '.join(words).capitalize() + '.'
+
+    def create_posts(self, user_ids, group_ids, images):
+        options = self.options
+        total = options['posts']
+        author_weights = power_law(len(user_ids), options['skew'])
+        group_weights = power_law(len(group_ids), options['skew'])
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        # Посты идут по времени, как при настоящей публикации.
+        step = (self.until - self.since) / max(total, 1)
+        post_times = array('d', (
+            self.since + (i + self.random.random()) * step
+            for i in range(total)
+        ))
+        created = 0
+        with explicit_dates(Post), transaction.atomic():
+            for size in self.batches(total):
+                authors = self.skewed(user_ids, author_weights, size)
+                groups = self.skewed(group_ids, group_weights, size)
+                posts = []
+                for author_id, group_id in zip(authors, groups):
+                    if self.random.random() < options['no_group']:
+                        group_id = None
+                    image = ''
+                    if images and self.random.random() < options['images']:
+                        image = self.random.choice(images)
+                    posts.append(Post(
+                        text=self.text(5, 60),
+                        author_id=author_id,
+                        group_id=group_id,
+                        image=image,
+                        pub_date=self.moment(post_times[created])
+                    ))
+                    created += 1
+                Post.objects.bulk_create(posts)
+        post_ids = array('l', Post.objects.filter(
+            id__gt=last_id
+        ).order_by('id').values_list('id', flat=True).iterator())
+        return post_ids, post_times
+
+    def moment(self, timestamp):
+        return dt.datetime.fromtimestamp(timestamp, dt.timezone.utc)
+
+    def create_comments(self, user_ids, post_ids, post_times):
+        if not post_ids:
+            return
+        positions = list(range(len(post_ids)))
+        self.random.shuffle(positions)
+        post_weights = power_law(len(positions), self.options['skew'])
+        with explicit_dates(Comment), transaction.atomic():
+            for size in self.batches(self.options['comments']):
+                posts = self.skewed(positions, post_weights, size)
+                Comment.objects.bulk_create([
+                    Comment(
+                        post_id=post_ids[position],
+                        author_id=self.random.choice(user_ids),
+                        text=self.text(3, 25),
+                        created=self.moment(min(
+                            self.until,
+                            post_times[position]
+                            + self.random.expovariate(1 / 3600)
+                        ))
+                    )
+                    for position in posts
+                ])
+
+    def create_follows(self, user_ids):
+        """Followers are uniform, authors follow a power law."""
+        author_weights = power_law(len(user_ids), self.options['skew'])
+        limit = len(user_ids) * (len(user_ids) - 1)
+        total = min(self.options['follows'], limit)
+        pairs = set()
+        with transaction.atomic():
+            while len(pairs) < total:
+                # Полная пачка даже под конец: пустая значит насыщение,
+                # а не неудачу пары случайных выборок.
+                authors = self.skewed(
+                    user_ids, author_weights, self.options['batch_size']
+                )
+                follows = []
+                for author_id in authors:
+                    user_id = self.random.choice(user_ids)
+                    if user_id == author_id or (user_id, author_id) in pairs:
+                        continue
+                    if len(pairs) == total:
+                        break
+                    pairs.add((user_id, author_id))
+                    follows.append(
+                        Follow(user_id=user_id, author_id=author_id)
+                    )
+                if not follows:
+                    # Все возможные подписки на популярных авторов уже есть.
+                    break
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
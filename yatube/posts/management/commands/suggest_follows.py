@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import compute
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает «Кого почитать» по графу подписок для '
+        'пользователей, чьи подписки изменились с прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать всех пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recomputed, users = compute(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {recomputed} из {users} '
+            f'за {time.perf_counter() - started:.2f} с.'
+        ))
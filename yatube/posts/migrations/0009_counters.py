@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    """The counters of this migration, counted from the source tables."""
+    users = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    groups = apps.get_model('posts', 'Group')._meta.db_table
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    comments = apps.get_model('posts', 'Comment')._meta.db_table
+    follows = apps.get_model('posts', 'Follow')._meta.db_table
+    stats = apps.get_model('posts', 'UserStats')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {stats} '
+            f'(user_id, posts_count, followers_count, following_count) '
+            f'SELECT id, '
+            f'(SELECT COUNT(*) FROM {posts} WHERE author_id = {users}.id), '
+            f'(SELECT COUNT(*) FROM {follows} WHERE author_id = {users}.id), '
+            f'(SELECT COUNT(*) FROM {follows} WHERE user_id = {users}.id) '
+            f'FROM {users}'
+        )
+        cursor.execute(
+            f'UPDATE {groups} SET posts_count = ('
+            f'SELECT COUNT(*) FROM {posts} WHERE group_id = {groups}.id)'
+        )
+        cursor.execute(
+            f'UPDATE {posts} SET comments_count = ('
+            f'SELECT COUNT(*) FROM {comments} WHERE post_id = {posts}.id)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
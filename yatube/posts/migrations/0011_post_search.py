@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TABLE = 'posts_search'
+
+
+def fill_index(apps, schema_editor):
+    """The index of this migration: a post with all its comments."""
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    comments = apps.get_model('posts', 'Comment')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, comments) '
+            f'SELECT id, text, ('
+            f'SELECT group_concat(text, char(10)) FROM {comments} '
+            f'WHERE post_id = {posts}.id'
+            f') FROM {posts}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            f"text, comments, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f'DROP TABLE {TABLE}'
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
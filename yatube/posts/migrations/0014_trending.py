@@ -0,0 +1,77 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:59
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Начало отсчёта posts.trending на момент миграции.
+EPOCH = '2020-01-01 00:00:00'
+
+
+def event_sql(kind, column):
+    """Logarithm of an event grown from EPOCH to the moment in the column."""
+    rate = math.log(2) / settings.TRENDING_HALF_LIFE
+    return (
+        f'{math.log(settings.TRENDING_WEIGHTS[kind])!r} + {rate!r} * '
+        f"(julianday({column}) - julianday('{EPOCH}')) * 86400"
+    )
+
+
+def fill_trends(apps, schema_editor):
+    """
+    The scores of this migration: log-sum-exp of the publication and
+    comment events of every post and of the posts of every group.
+    """
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    comments = apps.get_model('posts', 'Comment')._meta.db_table
+    groups = apps.get_model('posts', 'Group')._meta.db_table
+    events = (
+        f'SELECT id AS post_id, group_id, {event_sql("post", "pub_date")} '
+        f'AS x FROM {posts} '
+        f'UNION ALL SELECT post.id, post.group_id, '
+        f'{event_sql("comment", "comment.created")} '
+        f'FROM {comments} AS comment '
+        f'JOIN {posts} AS post ON post.id = comment.post_id'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        for table, key in ((posts, 'post_id'), (groups, 'group_id')):
+            cursor.execute(
+                f'UPDATE {table} SET trend = score.trend FROM ('
+                f'SELECT event.{key} AS id, '
+                f'top.x + LN(SUM(EXP(event.x - top.x))) AS trend '
+                f'FROM ({events}) AS event JOIN ('
+                f'SELECT {key}, MAX(x) AS x FROM ({events}) GROUP BY {key}'
+                f') AS top ON top.{key} = event.{key} '
+                f'GROUP BY event.{key}'
+                f') AS score WHERE score.id = {table}.id'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='trend',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trend',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(fill_trends, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-trend', '-id'], name='group_trend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trend', '-id'], name='post_trend_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_search_comments'
+TOKENIZE = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+
+def fill_index(apps, schema_editor):
+    """The indexes of this migration: posts and comments, row by row."""
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    comments = apps.get_model('posts', 'Comment')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) SELECT id, text FROM {posts}'
+        )
+        cursor.execute(
+            f'INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {comments}'
+        )
+        for table in (TABLE, COMMENTS_TABLE):
+            cursor.execute(
+                f"INSERT INTO {table} ({table}) VALUES ('optimize')"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_trending'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'DROP TABLE {TABLE}',
+            f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+            f'text, comments, {TOKENIZE})'
+        ),
+        migrations.RunSQL(
+            f'CREATE VIRTUAL TABLE {TABLE} USING fts5(text, {TOKENIZE})',
+            f'DROP TABLE {TABLE}'
+        ),
+        migrations.RunSQL(
+            f'CREATE VIRTUAL TABLE {COMMENTS_TABLE} USING fts5('
+            f'text, post_id UNINDEXED, {TOKENIZE})',
+            f'DROP TABLE {COMMENTS_TABLE}'
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -8,10 +8,19 @@ class Group(models.Model):
     title = models.CharField('Название группы', max_length=200)
     slug = models.SlugField('URL группы', unique=True)
     description = models.TextField('Описание группы')
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False
+    )
+    # Логарифм суммы событий, выращенных от начала отсчёта
+    # (posts/trending.py): чем больше, тем горячее.
+    trend = models.FloatField('Популярность', default=0, editable=False)
 
     class Meta:
         verbose_name = 'Группа'
         verbose_name_plural = 'Группы'
+        indexes = (
+            models.Index(fields=('-trend', '-id'), name='group_trend_idx'),
+        )
 
     def __str__(self) -> str:
         return self.title
@@ -22,6 +31,7 @@ class Post(models.Model):
         'Текст поста',
         help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -42,11 +52,29 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
+    # Как Group.trend: популярное читается по индексу.
+    trend = models.FloatField('Популярность', default=0, editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # По индексу на каждую ленту: страницы идут по (pub_date, id).
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'), name='post_feed_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_feed_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_feed_idx'
+            ),
+            models.Index(fields=('-trend', '-id'), name='post_trend_idx'),
+        )
 
     def __str__(self) -> str:
         return (self.text[:15])
@@ -78,6 +106,9 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(fields=('post', '-created'), name='comment_post_idx'),
+        )
 
     def __str__(self) -> str:
         return (f'Комментарий {self.author.username} к посту {self.post.id}')
@@ -100,7 +131,101 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        )
 
     def __str__(self) -> str:
         return (f'Подписка {self.user.username}'
                 f' на автора {self.author.username}')
+
+
+class UserStats(models.Model):
+    """Counters of a user, kept up to date by posts.signals."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return (f'Счётчики {self.user_id}')
+
+
+class FeedEntry(models.Model):
+    """Post delivered to a follower's materialized follow feed."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    # Копии полей поста: лента читается по индексу без join'а с Post.
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'), name='feed_page_idx'
+            ),
+            models.Index(fields=('user', 'author'), name='feed_author_idx'),
+        )
+
+    def __str__(self) -> str:
+        return (f'Пост {self.post_id} в ленте {self.user_id}')
+
+
+class FollowSuggestions(models.Model):
+    """Authors suggested to a user, computed by posts.suggestions."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='follow_suggestions',
+        verbose_name='Пользователь'
+    )
+    # Id авторов через запятую, лучшие первыми.
+    authors = models.TextField('Авторы', blank=True)
+    # Отпечаток подписок пользователя при расчёте: изменились ли они.
+    digest = models.CharField('Отпечаток подписок', max_length=32)
+    computed = models.DateTimeField('Дата расчёта', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Кого почитать'
+        verbose_name_plural = 'Кого почитать'
+
+    def __str__(self) -> str:
+        return (f'Кого почитать {self.user_id}')
@@ -0,0 +1,223 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from yatube.settings import NUM_POSTS_ON_PAGE
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def pack(*parts):
+    """Opaque url-safe token of the parts."""
+    raw = '|'.join(str(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def unpack(token):
+    """Parts of a token made by pack(), or None for a broken token."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    return raw.split('|')
+
+
+def encode_cursor(direction, post=None):
+    """Opaque token: direction and (pub_date, id) of the boundary post."""
+    if post is None:
+        return pack(direction)
+    return pack(direction, post.pub_date.isoformat(), post.id)
+
+
+def decode_cursor(token):
+    """Returns (direction, pub_date, id) or None for a broken token."""
+    parts = unpack(token)
+    if parts == [PREVIOUS]:
+        return PREVIOUS, None, None
+    if parts is None or len(parts) != 3 or parts[0] not in (NEXT, PREVIOUS):
+        return None
+    try:
+        pub_date = parse_datetime(parts[1])
+        post_id = int(parts[2])
+    except ValueError:
+        return None
+    if pub_date is None:
+        return None
+    return parts[0], pub_date, post_id
+
+
+def keyset(queryset, direction, pub_date, post_id, id_field='id',
+           date_field='pub_date'):
+    """
+    Orders the queryset by (date_field, id) and cuts it at the boundary.
+    The non-strict date bound comes first so the database can seek
+    the feed index instead of scanning it up to the boundary.
+    """
+    if direction == NEXT:
+        queryset = queryset.order_by('-' + date_field, '-' + id_field)
+        lookup = 'lt'
+    else:
+        queryset = queryset.order_by(date_field, id_field)
+        lookup = 'gt'
+    if pub_date is None:
+        return queryset
+    return queryset.filter(**{f'{date_field}__{lookup}e': pub_date}).filter(
+        Q(**{f'{date_field}__{lookup}': pub_date})
+        | Q(**{f'{id_field}__{lookup}': post_id})
+    )
+
+
+class LazyWindow:
+    """Posts of a cursor page, fetched on first use."""
+
+    def __init__(self, paginator):
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.paginator.window()[0])
+
+    def __len__(self):
+        return len(self.paginator.window()[0])
+
+    def __getitem__(self, index):
+        return self.paginator.window()[0][index]
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset paginator over posts ordered by (-pub_date, -id).
+
+    Every page is one range query of per_page + 1 rows, so deep pages
+    cost the same as the first one and no COUNT(*) is issued.
+    Numbered pages (legacy ?page=N links) are still served by the
+    regular Paginator API.
+
+    Pages are plain Page objects; the cursor state of the served page
+    lives on the paginator, so use one paginator per request. Forward
+    pages hit the database only when their posts are first read, so a
+    template fragment cache hit costs no query at all.
+    """
+    ordering = ('-pub_date', '-id')
+    is_cursor = False
+    last_cursor = encode_cursor(PREVIOUS)
+    # Граница страницы в токене: (pub_date, id) поста.
+    encode = staticmethod(encode_cursor)
+    decode = staticmethod(decode_cursor)
+
+    def __init__(self, object_list, per_page=NUM_POSTS_ON_PAGE, count=None,
+                 **kwargs):
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        if count is not None:
+            # Известное число постов (счётчик) избавляет от COUNT(*).
+            self.count = count
+        self._boundary = None
+        self._window = None
+
+    def fetch(self, direction, pub_date, post_id, limit):
+        """
+        Posts past the boundary (pub_date, post_id) in the given direction.
+        NEXT returns them newest first, PREVIOUS returns them oldest first.
+        """
+        return list(
+            keyset(self.object_list, direction, pub_date, post_id)[:limit]
+        )
+
+    def cursor_page(self, token=None):
+        """Page after (or before) the cursor; the first page for no token."""
+        cursor = self.decode(token) if token else None
+        if cursor is None:
+            cursor = (NEXT, None, None)
+        direction, pub_date, post_id = cursor
+        self.is_cursor = True
+        if direction == NEXT:
+            self._boundary = (pub_date, post_id)
+            self._window = None
+            return Page(LazyWindow(self), self._number(), self)
+        posts = self.fetch(direction, pub_date, post_id, self.per_page + 1)
+        if len(posts) <= self.per_page:
+            # Walked back to the top: serve a full first page instead.
+            return self.cursor_page()
+        posts = posts[:self.per_page]
+        posts.reverse()
+        self._window = (posts, pub_date is not None, True)
+        return Page(posts, self._number(), self)
+
+    def window(self):
+        """(posts, has_next, has_previous) of the served cursor page."""
+        if self._window is None:
+            pub_date, post_id = self._boundary
+            posts = self.fetch(NEXT, pub_date, post_id, self.per_page + 1)
+            self._window = (
+                posts[:self.per_page],
+                len(posts) > self.per_page,
+                pub_date is not None
+            )
+        return self._window
+
+    def _number(self):
+        # Page derives has_previous() from its number and has_next()
+        # from num_pages; a forward page knows the former without a query.
+        if self._window is None:
+            return 2 if self._boundary[0] is not None else 1
+        return 2 if self._window[2] else 1
+
+    @property
+    def num_pages(self):
+        if not self.is_cursor:
+            return super().num_pages
+        posts, has_next, has_previous = self.window()
+        number = self._number()
+        return number + 1 if has_next else number
+
+    @property
+    def next_cursor(self):
+        if not self.is_cursor:
+            return None
+        posts, has_next, has_previous = self.window()
+        if posts and has_next:
+            return self.encode(NEXT, posts[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if not self.is_cursor:
+            return None
+        posts, has_next, has_previous = self.window()
+        if posts and has_previous:
+            return self.encode(PREVIOUS, posts[0])
+        return None
+
+
+class CommentPaginator(CursorPaginator):
+    """Keyset pages of comments, newest first: the same cursors."""
+    ordering = ('-created', '-id')
+
+    def encode(self, direction, comment=None):
+        if comment is None:
+            return pack(direction)
+        return pack(direction, comment.created.isoformat(), comment.id)
+
+    def fetch(self, direction, created, comment_id, limit):
+        return list(keyset(
+            self.object_list, direction, created, comment_id,
+            date_field='created'
+        )[:limit])
+
+
+def paginate(request, post_list, paginator_class=CursorPaginator, **kwargs):
+    """
+    Page of posts for the request: numbered if an old ?page=N link
+    was followed, keyset-based otherwise.
+    """
+    paginator = paginator_class(post_list, NUM_POSTS_ON_PAGE, **kwargs)
+    page_number = request.GET.get('page')
+    if page_number and not request.GET.get('cursor'):
+        return paginator.get_page(page_number)
+    return paginator.cursor_page(request.GET.get('cursor'))
@@ -0,0 +1,242 @@
+"""
+Full-text search over posts and their comments.
+
+Two SQLite FTS5 inverted indexes: posts_search has one row per post
+(rowid = post id) with its text, posts_search_comments one row per
+comment (rowid = comment id) with its text and the post id. Signals
+index a post or a comment when it changes and drop its row when it
+goes, so a write touches one row however long the discussion is;
+rebuild() refills both indexes.
+
+Results are posts: a post scores the bm25 of its text, weighing
+POST_WEIGHT times more, plus the bm25 of its matching comments. Only
+the SEARCH_RANK_WINDOW most recent matches of each index are ranked:
+finding them is a walk down the index by rowid, while ranking every
+match of a frequent word would score most of the table. Pages use a
+(rank, id) cursor that also keeps the window, so a page is one index
+query and one lookup of the found posts, however deep it is.
+"""
+import math
+import re
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connection
+
+from .paginator import NEXT, PREVIOUS, CursorPaginator, pack, unpack
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_search_comments'
+# Во сколько раз совпадение в тексте поста весит больше, чем
+# в комментарии.
+POST_WEIGHT = 4.0
+TERM = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """
+    FTS5 query of every word of the user input as a prefix (a cheap
+    stand-in for Russian stemming). Operators and quotes of the input
+    are dropped, so any input is a valid query. Empty for no words.
+    """
+    return ' '.join(f'"{term}"*' for term in TERM.findall(query))
+
+
+def _tables(apps):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    return Post._meta.db_table, Comment._meta.db_table
+
+
+def index_post(post_id):
+    """Puts the text of the post into the index again."""
+    posts, _ = _tables(django_apps)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            f'SELECT id, text FROM {posts} WHERE id = %s',
+            [post_id]
+        )
+
+
+def unindex_post(post_id):
+    """Drops the post; its comments go with their own signals."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_comment(comment_id):
+    _, comments = _tables(django_apps)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s', [comment_id]
+        )
+        cursor.execute(
+            f'INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {comments} WHERE id = %s',
+            [comment_id]
+        )
+
+
+def unindex_comment(comment_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s', [comment_id]
+        )
+
+
+def rebuild(apps=django_apps, schema_editor=None):
+    """Refills both indexes from the posts and comments tables."""
+    posts, comments = _tables(apps)
+    db = schema_editor.connection if schema_editor else connection
+    with db.cursor() as cursor:
+        for table, insert in (
+            (TABLE, f'(rowid, text) SELECT id, text FROM {posts}'),
+            (
+                COMMENTS_TABLE,
+                f'(rowid, text, post_id) '
+                f'SELECT id, text, post_id FROM {comments}'
+            ),
+        ):
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'INSERT INTO {table} {insert}')
+            cursor.execute(
+                f"INSERT INTO {table} ({table}) VALUES ('optimize')"
+            )
+
+
+def filter_matching(queryset, query, table=TABLE, field='id'):
+    """
+    The queryset narrowed to the rows whose field is in the matches of
+    the index (posts or comments), or None when the query has no words.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return None
+    # RawSQL в id__in SQLite получила бы как скалярный подзапрос
+    # в двойных скобках, отсюда extra().
+    db_column = queryset.model._meta.get_field(field).column
+    return queryset.extra(
+        where=[
+            f'{queryset.model._meta.db_table}.{db_column} IN ('
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s)'
+        ],
+        params=[expression]
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """
+    Cursor pages of the posts matching the query, best rank first.
+    Filters by group and author are applied inside the index query.
+    """
+    # Индекс, столбец с id поста и вес совпадения.
+    sources = ((TABLE, 'rowid', POST_WEIGHT), (COMMENTS_TABLE, 'post_id', 1.0))
+
+    def __init__(self, object_list, per_page, query, group_id=None,
+                 author_id=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.expression = match_expression(query)
+        self.filters = {'group_id': group_id, 'author_id': author_id}
+        # Самые старые строки окна ранжирования в каждом индексе;
+        # переходят в курсоры.
+        self.floors = None
+
+    def encode(self, direction, post=None):
+        """Token of the page boundary: (rank, id) of the post and window."""
+        if post is None:
+            return pack(direction)
+        return pack(direction, repr(post.rank), post.id, *self.floors)
+
+    def decode(self, token):
+        parts = unpack(token)
+        if parts == [PREVIOUS]:
+            return PREVIOUS, None, None
+        if parts is None or len(parts) != 3 + len(self.sources) or (
+            parts[0] not in (NEXT, PREVIOUS)
+        ):
+            return None
+        try:
+            rank = float(parts[1])
+            post_id = int(parts[2])
+            floors = tuple(int(floor) for floor in parts[3:])
+        except ValueError:
+            return None
+        if not math.isfinite(rank):
+            return None
+        self.floors = floors
+        return parts[0], rank, post_id
+
+    def _where(self, table, post_column):
+        """Join and conditions of the query and filters in one index."""
+        posts, _ = _tables(django_apps)
+        where = [f'{table} MATCH %s']
+        params = [self.expression]
+        join = ''
+        for column, value in self.filters.items():
+            if value is not None:
+                join = f'JOIN {posts} ON {posts}.id = {table}.{post_column}'
+                where.append(f'{posts}.{column} = %s')
+                params.append(value)
+        return join, where, params
+
+    def _floor(self, index, table, join, where, params):
+        """Query of the oldest rowid of the window of one index."""
+        if self.floors is not None:
+            return 'SELECT %s', [self.floors[index]]
+        return (
+            f'SELECT coalesce(min(id), 0) FROM ('
+            f'SELECT {table}.rowid AS id FROM {table} {join} '
+            f'WHERE {" AND ".join(where)} '
+            f'ORDER BY {table}.rowid DESC LIMIT %s)',
+            params + [settings.SEARCH_RANK_WINDOW]
+        )
+
+    def fetch(self, direction, rank, post_id, limit):
+        if not self.expression:
+            return []
+        floors, hits, floor_params, hit_params = [], [], [], []
+        for index, (table, post_column, weight) in enumerate(self.sources):
+            join, where, params = self._where(table, post_column)
+            sql, sql_params = self._floor(index, table, join, where, params)
+            floors.append(f'floor{index}(floor) AS ({sql})')
+            floor_params += sql_params
+            hits.append(
+                f'SELECT {table}.{post_column}, {weight!r} * bm25({table}) '
+                f'FROM floor{index}, {table} {join} '
+                f'WHERE {" AND ".join(where)} '
+                f'AND {table}.rowid >= floor{index}.floor'
+            )
+            hit_params += params
+        order, sign = ('ASC', '>') if direction == NEXT else ('DESC', '<')
+        cut, cut_params = '', []
+        if rank is not None:
+            cut = f'WHERE score {sign} %s OR (score = %s AND id {sign} %s)'
+            cut_params = [rank, rank, post_id]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH {", ".join(floors)}, '
+                f'hit(id, score) AS ({" UNION ALL ".join(hits)}), '
+                f'ranked(id, score) AS ('
+                f'SELECT id, SUM(score) FROM hit GROUP BY id) '
+                f'SELECT id, score, '
+                + ', '.join(
+                    f'(SELECT floor FROM floor{index})'
+                    for index in range(len(self.sources))
+                )
+                + f' FROM ranked {cut} '
+                f'ORDER BY score {order}, id {order} LIMIT %s',
+                floor_params + hit_params + cut_params + [limit]
+            )
+            rows = cursor.fetchall()
+        if rows:
+            self.floors = rows[0][2:]
+        ranks = {row[0]: row[1] for row in rows}
+        found = self.object_list.in_bulk(ranks)
+        result = []
+        for found_id, found_rank in ranks.items():
+            if found_id in found:
+                found[found_id].rank = found_rank
+                result.append(found[found_id])
+        return result
@@ -0,0 +1,133 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cache, feed, follows, search, trending
+from .counters import bump, bump_user
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+# Посты, которые этот поток сейчас удаляет.
+_deleting = threading.local()
+
+
+def _deleted_posts():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+def post_scopes(author_id, *group_ids):
+    """Cache scopes of the feeds showing a post."""
+    scopes = ['index', trending.SCOPE, f'author:{author_id}']
+    scopes += [f'group:{group_id}' for group_id in group_ids if group_id]
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Keeps the old group: the post leaves its feed on save."""
+    instance._old_group_id = None
+    if instance.pk is not None:
+        instance._old_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def start_trend(sender, instance, **kwargs):
+    """A new post enters the trending feed with its publication."""
+    if instance.pk is None:
+        instance.trend = trending.event('post')
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def deliver_post(sender, instance, created, **kwargs):
+    """Counters, fan-out on write to the follow feeds, cache."""
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if created:
+        bump_user(instance.author_id, posts_count=1)
+        feed.fan_out(instance)
+        if instance.group_id:
+            trending.heat(Group.objects.filter(pk=instance.group_id), 'post')
+    search.index_post(instance.id)
+    if instance.group_id != old_group_id:
+        if instance.group_id:
+            bump(Group, instance.group_id, posts_count=1)
+        if old_group_id:
+            bump(Group, old_group_id, posts_count=-1)
+    cache.invalidate(*post_scopes(
+        instance.author_id, instance.group_id, old_group_id
+    ))
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleted(sender, instance, **kwargs):
+    """Comments deleted in cascade skip the work for a living post."""
+    _deleted_posts().add(instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def forget_post(sender, instance, **kwargs):
+    _deleted_posts().discard(instance.id)
+    search.unindex_post(instance.id)
+    bump_user(instance.author_id, posts_count=-1)
+    if instance.group_id:
+        bump(Group, instance.group_id, posts_count=-1)
+    cache.invalidate(*post_scopes(instance.author_id, instance.group_id))
+
+
+def comments_changed(post_id):
+    post = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', 'group_id').first()
+    if post is not None:
+        cache.invalidate(*post_scopes(*post))
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        bump(Post, instance.post_id, comments_count=1)
+        trending.commented(instance.post_id)
+    search.index_comment(instance.id)
+    comments_changed(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance.id)
+    if instance.post_id in _deleted_posts():
+        # Пост удаляется вместе с комментарием: его счётчик и кэш
+        # уходят с ним (forget_post).
+        return
+    bump(Post, instance.post_id, comments_count=-1)
+    comments_changed(instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cache.invalidate(cache.GROUPS, f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        follows.followed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    follows.unfollowed(instance.user_id, [instance.author_id])
@@ -0,0 +1,292 @@
+"""
+"Who to follow": authors suggested from the follow graph.
+
+The batch job (manage.py suggest_follows) reads Follow once, ordered,
+into CSR arrays: indptr and indices of the user -> author matrix A and
+of its transpose. An author b is scored for a user u by
+
+- friends of friends, (A·A)[u, b]: how many of u's authors follow b;
+- co-follow similarity, sum over u's authors a of sim(a, b), where
+  sim is the cosine of the follower columns of a and b (AᵀA divided
+  by the popularity of both); each author keeps its SIMILAR_AUTHORS
+  closest authors.
+
+Both are sparse row sums over the arrays, no query per user. The most
+followed authors fill the places the graph leaves empty, for users who
+follow no one in particular. The best
+SUGGESTIONS_COUNT authors a user does not follow are stored in
+FollowSuggestions and mirrored to the shared cache with usernames:
+pages read the cache (posts/holes.py), a follow drops the author from
+the cached list, and a list lost by the cache is read back from the
+table.
+
+A run recomputes the users whose follows changed since the previous
+run (a digest of their row of A) and their followers, whose friends
+of friends changed with them; full=True recomputes everyone. Reading
+Follow into the arrays is always whole, the scoring covers the stale
+users and the similarities only the authors they follow.
+"""
+import heapq
+from array import array
+from collections import Counter
+from hashlib import md5
+from math import sqrt
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from . import graph
+from .cache import invalidate
+from .models import Follow, FollowSuggestions
+
+User = get_user_model()
+
+# Строк в одном INSERT и id в одном IN (...).
+BATCH = 500
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), BATCH):
+        yield items[start:start + BATCH]
+
+
+def cache_key(user_id):
+    return f'posts:suggestions:{user_id}'
+
+
+def scope(user_id):
+    """Cache scope of the user's suggestions, for conditional GET."""
+    return f'suggestions:{user_id}'
+
+
+class CSR:
+    """
+    Rows of a sparse 0/1 matrix: the columns of row i are
+    indices[indptr[i]:indptr[i + 1]], sorted.
+    """
+
+    def __init__(self, pairs, size):
+        """pairs: (row, column) sorted by row, then column."""
+        counts = array('q', bytes(8 * (size + 1)))
+        self.indices = array('q')
+        for row, column in pairs:
+            counts[row + 1] += 1
+            self.indices.append(column)
+        for row in range(size):
+            counts[row + 1] += counts[row]
+        self.indptr = counts
+
+    def row(self, index):
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def length(self, index):
+        return self.indptr[index + 1] - self.indptr[index]
+
+    def transpose(self, size):
+        pairs = sorted(
+            (column, row)
+            for row in range(len(self.indptr) - 1)
+            for column in self.row(row)
+        )
+        return CSR(pairs, size)
+
+
+def load_graph():
+    """Dense user indices and the follow matrix A with its transpose."""
+    user_ids = array('q', User.objects.order_by('id').values_list(
+        'id', flat=True
+    ))
+    index = {user_id: position for position, user_id in enumerate(user_ids)}
+    follows = Follow.objects.order_by('user_id', 'author_id').values_list(
+        'user_id', 'author_id'
+    )
+    # Подписки на пользователей, созданных после первого запроса,
+    # подождут следующего запуска.
+    following = CSR(
+        (
+            (index[user_id], index[author_id])
+            for user_id, author_id in follows.iterator()
+            if user_id in index and author_id in index
+        ),
+        len(user_ids)
+    )
+    return user_ids, following, following.transpose(len(user_ids))
+
+
+def similar_authors(following, followers, authors):
+    """
+    Top SIMILAR_AUTHORS authors by co-follow cosine for each of the
+    authors: their rows of AᵀA, summed over the rows of A of their
+    followers. Only the authors followed by the stale users are asked
+    for, so a small run reads a small part of the graph.
+    """
+    similar = {}
+    for author in authors:
+        counts = Counter()
+        for user in followers.row(author):
+            counts.update(following.row(user))
+        del counts[author]
+        norm = followers.length(author)
+        similar[author] = heapq.nlargest(
+            settings.SIMILAR_AUTHORS,
+            (
+                (count / sqrt(norm * followers.length(other)), other)
+                for other, count in counts.items()
+            )
+        )
+    return similar
+
+
+def popular_authors(followers):
+    """Authors with followers, the most followed first."""
+    return sorted(
+        (
+            author for author in range(len(followers.indptr) - 1)
+            if followers.length(author)
+        ),
+        key=lambda author: (-followers.length(author), author)
+    )
+
+
+def suggest(user, following, similar, popular):
+    """
+    Indices of the best authors for the user, best first; the most
+    followed authors fill the places the graph left empty.
+    """
+    authors = following.row(user)
+    scores = Counter()
+    for author in authors:
+        scores.update(following.row(author))
+        for similarity, other in similar.get(author, ()):
+            scores[other] += similarity
+    excluded = set(authors)
+    excluded.add(user)
+    for author in excluded:
+        scores.pop(author, None)
+    # При равных очках — меньший индекс, то есть пользователь старше.
+    best = [author for author, score in heapq.nlargest(
+        settings.SUGGESTIONS_COUNT,
+        scores.items(),
+        key=lambda item: (item[1], -item[0])
+    )]
+    for author in popular:
+        if len(best) == settings.SUGGESTIONS_COUNT:
+            break
+        if author not in excluded and author not in best:
+            best.append(author)
+    return best
+
+
+def digest(authors):
+    return md5(authors.tobytes()).hexdigest()
+
+
+def stale_users(user_ids, following, followers, full):
+    """Indices of the users whose suggestions have to be recomputed."""
+    stored = dict(FollowSuggestions.objects.values_list('user_id', 'digest'))
+    changed = {
+        user for user, user_id in enumerate(user_ids)
+        if full or stored.get(user_id) != digest(following.row(user))
+    }
+    stale = set(changed)
+    for user in changed:
+        stale.update(followers.row(user))
+    return sorted(stale)
+
+
+def compute(full=False):
+    """
+    Recomputes and stores the suggestions of the stale users.
+    Returns (recomputed users, all users).
+    """
+    user_ids, following, followers = load_graph()
+    stale = stale_users(user_ids, following, followers, full)
+    if not stale:
+        return 0, len(user_ids)
+    similar = similar_authors(following, followers, sorted({
+        author for user in stale for author in following.row(user)
+    }))
+    popular = popular_authors(followers)
+    suggested = {
+        user_ids[user]: [
+            user_ids[author]
+            for author in suggest(user, following, similar, popular)
+        ]
+        for user in stale
+    }
+    digests = {
+        user_ids[user]: digest(following.row(user)) for user in stale
+    }
+    with transaction.atomic():
+        for chunk in _chunks(suggested):
+            FollowSuggestions.objects.filter(user_id__in=chunk).delete()
+        FollowSuggestions.objects.bulk_create(
+            [
+                FollowSuggestions(
+                    user_id=user_id,
+                    authors=','.join(map(str, authors)),
+                    digest=digests[user_id]
+                )
+                for user_id, authors in suggested.items()
+            ],
+            batch_size=BATCH
+        )
+    cache.set_many({
+        cache_key(user_id): authors
+        for user_id, authors in _named(suggested).items()
+    }, None)
+    invalidate(*(scope(user_id) for user_id in suggested))
+    return len(stale), len(user_ids)
+
+
+def _named(suggested):
+    """(id, username) of the suggested authors, per user."""
+    names = {}
+    for chunk in _chunks({
+        author for authors in suggested.values() for author in authors
+    }):
+        names.update(
+            User.objects.filter(id__in=chunk).values_list('id', 'username')
+        )
+    return {
+        user_id: [
+            (author, names[author]) for author in authors
+            if author in names
+        ]
+        for user_id, authors in suggested.items()
+    }
+
+
+def cached(user_id):
+    """
+    Stored suggestions of the user, (id, username). No queries while
+    the cache holds them; after an eviction or a clear() they are read
+    back from FollowSuggestions, without the authors followed since.
+    """
+    authors = cache.get(cache_key(user_id))
+    if authors is not None:
+        return authors
+    stored = FollowSuggestions.objects.filter(
+        user_id=user_id
+    ).values_list('authors', flat=True).first()
+    suggested = [
+        author for author in map(int, filter(None, (stored or '').split(',')))
+        if not graph.is_following(user_id, author)
+    ] if stored else []
+    authors = _named({user_id: suggested})[user_id]
+    cache.set(cache_key(user_id), authors, None)
+    return authors
+
+
+def drop(user_id, author_ids):
+    """Removes just followed authors from the user's suggestions."""
+    current = cache.get(cache_key(user_id))
+    if current is None:
+        # cached() прочтёт список из таблицы уже без них.
+        return
+    kept = [author for author in current if author[0] not in author_ids]
+    if len(kept) != len(current):
+        cache.set(cache_key(user_id), kept, None)
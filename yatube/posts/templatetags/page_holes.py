@@ -0,0 +1,17 @@
+from django import template
+
+from posts.holes import marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, *args):
+    """
+    Fragment of the page that depends on the reader: rendered in place,
+    or left as a marker while the page cache renders the shared page.
+    """
+    request = context.get('request')
+    if getattr(request, 'punching_holes', False):
+        return marker(name, args)
+    return render_hole(request, name, args)
@@ -0,0 +1,73 @@
+from hashlib import md5
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import geometry_size, ready_thumbnail
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_GEOMETRY = '960x339'
+# Что показывает карточка на странице: автора, название группы.
+VARIANTS = {
+    'feed': {'with_author': True, 'with_group_title': True},
+    'profile': {'with_author': False, 'with_group_title': True},
+    'group': {'with_author': True, 'with_group_title': False},
+}
+
+
+def card_key(post, with_author, with_group_title):
+    """
+    Key of the card HTML: the post version plus everything the card
+    shows from its author and group.
+    """
+    group = post.group
+    parts = (
+        post.id, post.updated.isoformat(),
+        post.author.username, post.author.get_full_name(),
+        group and group.slug, group and group.title,
+        with_author, with_group_title,
+    )
+    return f'posts:card:{md5(repr(parts).encode()).hexdigest()}'
+
+
+def render_card(post, with_author, with_group_title):
+    """Card HTML and whether it is final (no thumbnail placeholder)."""
+    thumbnail = ready_thumbnail(post, CARD_GEOMETRY)
+    width, height = geometry_size(CARD_GEOMETRY)
+    html = get_template(CARD_TEMPLATE).render({
+        'post': post,
+        'with_author': with_author,
+        'with_group_title': with_group_title,
+        'image': post.image,
+        'thumbnail': thumbnail,
+        'width': width,
+        'height': height,
+    })
+    return html, thumbnail is not None or not post.image
+
+
+@register.filter
+def post_cards(posts, variant='feed'):
+    """
+    HTML cards of the posts. Cards are memoized per post version, so a
+    page only renders the posts not shown before.
+    """
+    options = VARIANTS[variant]
+    posts = list(posts)
+    keys = [card_key(post, **options) for post in posts]
+    cards = cache.get_many(keys)
+    rendered = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            cards[key], final = render_card(post, **options)
+            # Заглушку миниатюры не запоминаем: картинка скоро будет готова.
+            if final:
+                rendered[key] = cards[key]
+    if rendered:
+        cache.set_many(rendered, settings.FEED_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,22 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj):
+    """
+    Page numbers to link around the current page: at most
+    PAGE_WINDOW on each side, plus the first and the last page.
+    None marks a gap. The size does not depend on the page count.
+    """
+    last = page_obj.paginator.num_pages
+    start = max(1, page_obj.number - settings.PAGE_WINDOW)
+    end = min(last, page_obj.number + settings.PAGE_WINDOW)
+    pages = list(range(start, end + 1))
+    if start > 1:
+        pages[:0] = [1] if start == 2 else [1, None]
+    if end < last:
+        pages += [last] if end == last - 1 else [None, last]
+    return pages
@@ -0,0 +1,17 @@
+from django import template
+
+from posts.thumbnails import geometry_size, ready_thumbnail
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/thumbnail.html')
+def post_thumbnail(post, geometry):
+    """Pre-rendered thumbnail of the post image or its placeholder."""
+    width, height = geometry_size(geometry)
+    return {
+        'image': post.image,
+        'thumbnail': ready_thumbnail(post, geometry),
+        'width': width,
+        'height': height,
+    }
@@ -34,6 +34,16 @@ POSTS_PAGES_TEST_ATTRIBUTES = {
         'reversed_name': reverse('posts:follow_index'),
         'template': 'posts/follow.html'
     },
+    'trending': {
+        'page_url': '/trending/',
+        'reversed_name': reverse('posts:trending'),
+        'template': 'posts/trending.html'
+    },
+    'hot_groups': {
+        'page_url': '/groups/hot/',
+        'reversed_name': reverse('posts:hot_groups'),
+        'template': 'posts/hot_groups.html'
+    },
     'profile_follow': {
         'page_url': '/profile/Author/follow/'
     },
@@ -44,6 +54,53 @@ POSTS_PAGES_TEST_ATTRIBUTES = {
 
 LOGIN_PAGE_URL = '/auth/login/'
 
+# Сессия и пользователь авторизованного клиента.
+AUTH_QUERIES = 2
+
+# Запросы страниц с холодным кэшем, без учёта AUTH_QUERIES.
+# Не зависят от числа постов и комментариев на странице.
+QUERY_BUDGETS = {
+    # Страница постов.
+    'index': 1,
+    # Id группы для ETag, группа, страница постов.
+    'group_list': 3,
+    # Id автора для ETag, автор со счётчиками, подписки читателя,
+    # «Кого почитать» из таблицы (posts/suggestions.py), страница постов.
+    'profile': 5,
+    # Подписки читателя (posts/graph.py), «Кого почитать» из таблицы,
+    # страница ленты, авторы-знаменитости среди подписок.
+    'follow_index': 4,
+    # Автор поста для ETag, пост со счётчиками автора, комментарии.
+    'post_detail': 3,
+    # Группы для формы.
+    'create_post': 1,
+    # Пост, группы для формы.
+    'post_edit': 2,
+    # Группы для формы, поисковый индекс, найденные посты.
+    'search': 3,
+    # Страница популярных постов.
+    'trending': 1,
+    # Страница горячих групп.
+    'hot_groups': 1,
+}
+
+# Запросы JSON API с холодным кэшем, всего: сессию читает
+# только лента подписок.
+API_QUERY_BUDGETS = {
+    # Страница постов.
+    'api_index': 1,
+    # Группа, страница постов.
+    'api_group': 2,
+    # Автор, страница постов.
+    'api_profile': 2,
+    # Сессия, пользователь, подписки, страница ленты, знаменитости.
+    'api_follow': AUTH_QUERIES + 3,
+    # Пост.
+    'api_post': 1,
+    # Страница комментариев.
+    'api_comments': 1,
+}
+
 TEST_POST = {
     'text': 'Тестовый пост'
 }
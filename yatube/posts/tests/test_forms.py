@@ -1,16 +1,26 @@
 import shutil
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from posts import thumbnails
+from posts.forms import PostForm
 from posts.models import Comment, Group, Post, User
 from posts.tests.constants import (
     POSTS_PAGES_TEST_ATTRIBUTES,
     TEST_AUTHOR,
     TEST_GROUP,
     TEST_POST,
+    TEST_SMALL_GIF,
     TEST_UPLOADED,
     TEMP_MEDIA_ROOT
 )
@@ -67,7 +77,8 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(
                 text=TEST_POST['text'],
                 group=PostCreateFormTests.group,
-                image=PostCreateFormTests.image_folder + TEST_UPLOADED.name
+                # Картинка пересохранена в JPEG.
+                image=PostCreateFormTests.image_folder + 'small.jpg'
             ).exists()
         )
 
@@ -110,6 +121,93 @@ class PostCreateFormTests(TestCase):
         )
         self.assertEqual(Post.objects.count(), posts_count)
 
+    @override_settings(POST_THUMBNAIL_WORKERS=0)
+    def test_uploaded_image_thumbnails_are_queued_after_commit(self):
+        form_data = {
+            'text': 'Пост с миниатюрами',
+            'image': SimpleUploadedFile(
+                name='queued.gif',
+                content=TEST_SMALL_GIF,
+                content_type='image/gif'
+            )
+        }
+        with mock.patch(
+            'posts.forms.transaction.on_commit', side_effect=lambda job: job()
+        ) as on_commit:
+            self.author_client.post(
+                PostCreateFormTests.pages_attribs['create_post'][
+                    'reversed_name'
+                ],
+                data=form_data
+            )
+        # После коммита откладывается и сброс поколений кэша.
+        self.assertIn(
+            'PostForm.save.<locals>.<lambda>',
+            [job.__qualname__ for (job,), _ in on_commit.call_args_list]
+        )
+        image = Post.objects.get(text='Пост с миниатюрами').image
+        names = cache.get(thumbnails.cache_key(image.name))
+        for geometry in settings.POST_THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry):
+                self.assertTrue(default_storage.exists(names[geometry]))
+
+
+class PostImageUploadTests(TestCase):
+    """Uploads are downscaled and re-encoded without metadata."""
+
+    @staticmethod
+    def upload(name, size, mode='RGB', format='JPEG', **params):
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, format, **params)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def clean_image(self, upload):
+        form = PostForm(data={'text': TEST_POST['text']}, files={
+            'image': upload
+        })
+        valid = form.is_valid()
+        return valid, form.cleaned_data.get('image'), form.errors
+
+    def test_large_photo_is_downscaled_without_metadata(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        valid, image, _ = self.clean_image(
+            self.upload('photo.jpeg', (4000, 3000), exif=exif.tobytes())
+        )
+        self.assertTrue(valid)
+        self.assertEqual(image.name, 'photo.jpg')
+        with Image.open(image) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(
+                stored.size, (settings.POST_IMAGE_MAX_SIDE, 1440)
+            )
+            self.assertEqual(len(stored.getexif()), 0)
+
+    def test_transparent_image_stays_png(self):
+        valid, image, _ = self.clean_image(
+            self.upload('logo.gif', (10, 10), 'RGBA', 'PNG')
+        )
+        self.assertTrue(valid)
+        self.assertEqual(image.name, 'logo.png')
+        with Image.open(image) as stored:
+            self.assertEqual(stored.mode, 'RGBA')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_image_over_pixel_ceiling_is_rejected(self):
+        valid, _, errors = self.clean_image(
+            self.upload('wide.png', (20, 10), format='PNG')
+        )
+        self.assertFalse(valid)
+        self.assertIn('image', errors)
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_file_over_size_limit_is_rejected(self):
+        valid, _, errors = self.clean_image(
+            self.upload('heavy.jpg', (20, 10))
+        )
+        self.assertFalse(valid)
+        self.assertIn('image', errors)
+
 
 class PostEditFormTests(TestCase):
     @classmethod
@@ -1,7 +1,21 @@
-from django.test import TestCase
+import datetime
+import shutil
+from io import StringIO
 
-from posts.models import Comment, Follow, Group, Post, User
-from posts.tests.constants import TEST_AUTHOR, TEST_COMMENT, TEST_GROUP
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from posts import suggestions
+from posts.counters import recount
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, Post, User, UserStats
+)
+from posts.search import filter_matching
+from posts.tests.constants import (
+    TEMP_MEDIA_ROOT, TEST_AUTHOR, TEST_COMMENT, TEST_GROUP
+)
 
 
 class PostModelTest(TestCase):
@@ -119,3 +133,190 @@ class PostModelTest(TestCase):
                             expected_text,
                             f'В модели {model} некорректные help_text.'
                         )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.user_2 = User.objects.create_user(username='SecondUser')
+        cls.group = Group.objects.create(
+            title=TEST_GROUP['title'],
+            slug=TEST_GROUP['slug'],
+            description=TEST_GROUP['description']
+        )
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_counters_follow_writes(self):
+        """Creating and deleting rows keeps every counter in sync."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.user_2, text=TEST_COMMENT['text']
+        )
+        follow = Follow.objects.create(user=self.user_2, author=self.user)
+        self.refresh(post, self.group, self.user.stats, self.user_2.stats)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(self.user.stats.followers_count, 1)
+        self.assertEqual(self.user_2.stats.following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.group = None
+        post.save()
+        self.refresh(self.group, self.user.stats, self.user_2.stats)
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.user.stats.followers_count, 0)
+        self.assertEqual(self.user_2.stats.following_count, 0)
+
+        post.delete()
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, 0)
+
+    def test_recount_command_repairs_drift(self):
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        Follow.objects.create(user=self.user_2, author=self.user)
+        UserStats.objects.update(posts_count=7, followers_count=0)
+        Group.objects.update(posts_count=0)
+
+        out = StringIO()
+        call_command('recount_counters', stdout=out)
+
+        self.refresh(self.group, self.user.stats)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(self.user.stats.followers_count, 1)
+        self.assertIn(
+            'userstats.posts_count: исправлено строк 2', out.getvalue()
+        )
+
+
+class FollowConstraintTest(TestCase):
+    def test_follow_is_unique(self):
+        user = User.objects.create_user(username='Follower')
+        author = User.objects.create_user(username=TEST_AUTHOR['username'])
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
+
+
+@override_settings(SUGGESTIONS_COUNT=2)
+class FollowSuggestionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'b', 'c', 'd', 'e', 'x', 'newcomer')
+        }
+        for user, author in (
+            ('reader', 'b'), ('reader', 'c'), ('b', 'd'), ('c', 'd'),
+            ('c', 'e'), ('x', 'c'), ('x', 'e'),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def suggested(self, name):
+        return [
+            username for _, username
+            in suggestions.cached(self.users[name].id)
+        ]
+
+    def test_friends_of_friends_and_co_follows_come_first(self):
+        out = StringIO()
+        call_command('suggest_follows', stdout=out)
+        self.assertIn('Пересчитано пользователей: 7 из 7', out.getvalue())
+        # d — у обоих авторов читателя, e — у одного и читается вместе с c.
+        self.assertEqual(self.suggested('reader'), ['d', 'e'])
+        # Без подписок — самые читаемые авторы.
+        self.assertEqual(self.suggested('newcomer'), ['c', 'd'])
+
+    def test_only_changed_users_are_recomputed(self):
+        suggestions.compute()
+        self.assertEqual(suggestions.compute(), (0, 7))
+        Follow.objects.create(user=self.users['b'], author=self.users['e'])
+        # b и его подписчик reader.
+        self.assertEqual(suggestions.compute(), (2, 7))
+        self.assertEqual(suggestions.compute(full=True), (7, 7))
+
+    def test_follow_drops_author_from_suggestions(self):
+        suggestions.compute()
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['d']
+        )
+        self.assertEqual(self.suggested('reader'), ['e'])
+
+    def test_suggestions_lost_by_the_cache_are_read_back(self):
+        suggestions.compute()
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['d']
+        )
+        cache.clear()
+        self.assertEqual(self.suggested('reader'), ['e'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggested('reader'), ['e'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedCommandTest(TestCase):
+    OPTIONS = {
+        'users': 30, 'groups': 5, 'posts': 300, 'comments': 200,
+        'follows': 60, 'until': datetime.date(2026, 1, 1),
+    }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        call_command('seed', stdout=StringIO(), **self.OPTIONS, **options)
+        return (
+            list(Post.objects.order_by('id').values_list(
+                'text', 'author__username', 'group__slug', 'image', 'pub_date'
+            )),
+            sorted(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            list(Comment.objects.order_by('id').values_list(
+                'text', 'created'
+            )),
+        )
+
+    def test_seed_is_repeatable(self):
+        first = self.seed()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+        self.assertNotEqual(self.seed(seed=2)[0][-300:], first[0])
+
+    def test_seeded_data_is_consistent(self):
+        self.seed()
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertTrue(Post.objects.filter(group=None).exists())
+        self.assertFalse(any(recount().values()))
+        followed = Follow.objects.values_list('user', 'author').first()
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user_id=followed[0], author_id=followed[1]
+            ).count(),
+            Post.objects.filter(author_id=followed[1]).count()
+        )
+        self.assertTrue(
+            filter_matching(Post.objects.all(), Post.objects.first().text)
+            .exists()
+        )
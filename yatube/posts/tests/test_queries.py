@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import suggestions
+from posts.management.commands.benchmark import compare, route_names
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.constants import (
+    API_QUERY_BUDGETS,
+    AUTH_QUERIES,
+    QUERY_BUDGETS,
+    TEST_AUTHOR,
+    TEST_COMMENT,
+    TEST_GROUP,
+    TEST_POST
+)
+
+
+class QueryBudgetTests(TestCase):
+    """Every page renders with a fixed number of queries."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title=TEST_GROUP['title'],
+            slug=TEST_GROUP['slug'],
+            description=TEST_GROUP['description']
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user_author)
+        for i in range(12):
+            cls.post = Post.objects.create(
+                author=cls.user_author,
+                text=f'{TEST_POST["text"]} {i}',
+                group=cls.group
+            )
+        commentators = [
+            User.objects.create_user(username=f'Commentator{i}')
+            for i in range(5)
+        ]
+        for commentator in commentators:
+            Comment.objects.create(
+                author=commentator,
+                post=cls.post,
+                text=TEST_COMMENT['text']
+            )
+        cls.urls = {
+            'index': reverse('posts:index'),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': cls.group.slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': cls.user_author.username}
+            ),
+            'follow_index': reverse('posts:follow_index'),
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': cls.post.id}
+            ),
+            'create_post': reverse('posts:create_post'),
+            'post_edit': reverse(
+                'posts:post_edit', kwargs={'post_id': cls.post.id}
+            ),
+            'search': reverse('posts:search') + '?q=Тестовый',
+            'trending': reverse('posts:trending'),
+            'hot_groups': reverse('posts:hot_groups'),
+            'api_index': reverse('posts:api_index'),
+            'api_group': reverse('posts:api_group', args=[cls.group.slug]),
+            'api_profile': reverse(
+                'posts:api_profile', args=[cls.user_author.username]
+            ),
+            'api_follow': reverse('posts:api_follow'),
+            'api_post': reverse('posts:api_post', args=[cls.post.id]),
+            'api_comments': reverse('posts:api_comments', args=[cls.post.id]),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.user_author)
+
+    def test_pages_stay_within_query_budget(self):
+        for page_name, budget in QUERY_BUDGETS.items():
+            with self.subTest(page_name=page_name):
+                client = self.reader_client
+                if page_name == 'post_edit':
+                    client = self.author_client
+                cache.clear()
+                with self.assertNumQueries(budget + AUTH_QUERIES):
+                    response = client.get(self.urls[page_name])
+                self.assertEqual(response.status_code, 200)
+
+    def test_api_stays_within_query_budget(self):
+        for page_name, budget in API_QUERY_BUDGETS.items():
+            with self.subTest(page_name=page_name):
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    response = self.reader_client.get(self.urls[page_name])
+                self.assertEqual(response.status_code, 200)
+
+    def test_cached_follow_suggestions_add_no_queries(self):
+        commentator = User.objects.get(username='Commentator0')
+        for page_name in ('profile', 'follow_index'):
+            with self.subTest(page_name=page_name):
+                cache.clear()
+                cache.set(
+                    suggestions.cache_key(self.reader.id),
+                    [(commentator.id, commentator.username)], None
+                )
+                # Список из кэша: без запроса к таблице.
+                with self.assertNumQueries(
+                    QUERY_BUDGETS[page_name] - 1 + AUTH_QUERIES
+                ):
+                    response = self.reader_client.get(self.urls[page_name])
+                self.assertContains(response, 'Кого почитать')
+
+    def test_warm_follow_graph_skips_follows_query(self):
+        """
+        The followed authors come from posts/graph.py once loaded, the
+        suggestions from the cache.
+        """
+        self.reader_client.get(self.urls['follow_index'])
+        with self.assertNumQueries(
+            QUERY_BUDGETS['follow_index'] - 2 + AUTH_QUERIES
+        ):
+            self.reader_client.get(self.urls['follow_index'])
+
+    def test_cached_feed_pages_skip_posts_query(self):
+        """A fragment cache hit does not fetch the posts page."""
+        self.reader_client.get(self.urls['index'])
+        with self.assertNumQueries(AUTH_QUERIES):
+            self.reader_client.get(self.urls['index'])
+
+
+class BenchmarkCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username=TEST_AUTHOR['username'])
+        reader = User.objects.create_user(username='Reader')
+        User.objects.create_user(username='Celebrity')
+        group = Group.objects.create(**TEST_GROUP)
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(
+            author=author, text=TEST_POST['text'], group=group
+        )
+        Comment.objects.create(
+            author=reader, post=post, text=TEST_COMMENT['text']
+        )
+
+    def benchmark(self, *args):
+        path = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        call_command(
+            'benchmark', '--requests=2', '--warmup=0', f'--output={path}',
+            *args, stdout=StringIO()
+        )
+        with open(path, encoding='utf-8') as output:
+            return json.load(output), path
+
+    def test_every_route_is_measured(self):
+        results, _ = self.benchmark()
+        self.assertEqual(set(results['routes']), set(route_names()))
+        for name, result in results['routes'].items():
+            with self.subTest(name=name):
+                self.assertIn(result['status'], (200, 302))
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['peak_memory_bytes'], 0)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_regressions_against_baseline(self):
+        _, path = self.benchmark('--route=about:tech')
+        with open(path, encoding='utf-8') as output:
+            baseline = json.load(output)
+        current = json.loads(json.dumps(baseline))
+        route = current['routes']['about:tech']
+        route['queries'] += 1
+        route['p95_ms'] = baseline['routes']['about:tech']['p95_ms'] + 5
+        self.assertEqual(len(compare(baseline, current, 0.2, 1.0)), 2)
+        self.assertEqual(compare(baseline, baseline, 0.2, 1.0), [])
+        with self.assertRaises(CommandError):
+            self.benchmark('--route=posts:index', '--transport=wsgi',
+                           f'--baseline={path}')
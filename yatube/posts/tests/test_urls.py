@@ -1,5 +1,6 @@
 from http import HTTPStatus
 
+from django.core.cache import cache
 from django.test import Client, TestCase
 
 from posts.models import Group, Post, User
@@ -49,6 +50,8 @@ class PostURLTests(TestCase):
         }
 
     def setUp(self):
+        # Страницы из общего кэша не рендерят свои шаблоны.
+        cache.clear()
         self.guest_client = Client()
         self.user_second = User.objects.create_user(username='SecondUser')
         self.authorized_client = Client()
@@ -63,7 +66,9 @@ class PostURLTests(TestCase):
                     'index',
                     'group_list',
                     'profile',
-                    'post_detail'
+                    'post_detail',
+                    'trending',
+                    'hot_groups'
                 ]
             },
             'logged_in': {
@@ -1,12 +1,33 @@
+import re
 import shutil
 import time
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
 
 from django import forms
+from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from posts.models import User, Group, Post, Comment, Follow
+from posts import (
+    feed, follows, graph, search, suggestions, thumbnails, trending
+)
+from posts.counters import recount
+from posts.models import (
+    User, Group, Post, Comment, FeedEntry, Follow, UserStats
+)
+from posts.search import SearchPaginator
+from posts.templatetags.post_cards import post_cards
+from posts.templatetags.post_pages import page_window
 from posts.tests.constants import (
     POSTS_PAGES_TEST_ATTRIBUTES,
     TEST_AUTHOR,
@@ -16,6 +37,7 @@ from posts.tests.constants import (
     TEST_UPLOADED,
     TEMP_MEDIA_ROOT
 )
+from yatube.settings import COMMENTS_ON_PAGE
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -102,6 +124,8 @@ class PostViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Страницы из общего кэша не рендерят свои шаблоны.
+        cache.clear()
         self.author_client = Client()
         self.author_client.force_login(self.user_author)
         self.author_2_client = Client()
@@ -206,6 +230,33 @@ class PostViewsTests(TestCase):
                 post_author = post_list[i].author
                 self.assertEqual(post_author, self.user_author)
 
+    def test_pages_of_user_without_counters_row_render(self):
+        """Users created around the signals get live counts."""
+        User.objects.bulk_create([User(username='bulk')])
+        user = User.objects.get(username='bulk')
+        Post.objects.bulk_create([
+            Post(text='Пост без счётчиков', author=user)
+        ])
+        Follow.objects.bulk_create([Follow(user=self.user_author,
+                                           author=user)])
+        self.assertFalse(UserStats.objects.filter(user=user).exists())
+        response = self.author_client.get(
+            reverse('posts:profile', args=[user.username])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertContains(response, 'Подписчиков: 1')
+        response = self.author_client.get(
+            reverse('posts:post_detail', args=[user.posts.get().id])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
+        response = self.author_client.get(
+            reverse('posts:api_profile', args=[user.username])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
     # Testing Create_post and Post_edit pages
     def test_create_and_edit_post_pages_correct_form_field_types(self):
         """Create_post and Post_edit pages show correct form field types."""
@@ -280,6 +331,419 @@ class PostViewsTests(TestCase):
         )
         self.assertTrue(new_comment_text in response.content.decode("utf-8"))
 
+    def test_image_placeholder_until_thumbnail_is_rendered(self):
+        """Pages never resize images, they queue them for the worker."""
+        url = self.pages_attribs['post_detail']['reversed_name']
+        with mock.patch('posts.thumbnails.enqueue') as enqueue:
+            response = self.author_client.get(url)
+            card = post_cards([self.post_4])[0]
+        self.assertContains(response, 'Изображение готовится')
+        self.assertIn('Изображение готовится', card)
+        self.assertEqual(
+            {post for (post,), _ in enqueue.call_args_list}, {self.post_4}
+        )
+        # Готовая миниатюра сбрасывает кэш страниц поста.
+        thumbnails.enqueue(self.post_4)
+        names = cache.get(thumbnails.cache_key(self.post_4.image.name))
+        response = self.author_client.get(url)
+        self.assertContains(response, default_storage.url(names['960x650']))
+        self.assertContains(response, 'width="960" height="650"')
+        # Карточка с заглушкой не запоминается.
+        card = post_cards([self.post_4])[0]
+        self.assertIn('width="960" height="339"', card)
+
+    def test_missing_thumbnails_fill_in_after_first_view(self):
+        """Images without thumbnails are queued by the pages."""
+        url = self.pages_attribs['post_detail']['reversed_name']
+        response = self.author_client.get(url)
+        self.assertContains(response, 'Изображение готовится')
+        response = self.author_client.get(url)
+        self.assertNotContains(response, 'Изображение готовится')
+        self.assertContains(response, 'width="960" height="650"')
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.post = Post.objects.create(
+            author=cls.user_author, text=TEST_POST['text']
+        )
+        cls.total = COMMENTS_ON_PAGE + 5
+        Comment.objects.bulk_create(
+            Comment(
+                author=cls.user_author, post=cls.post, text=f'Комментарий {i}'
+            )
+            for i in range(cls.total)
+        )
+        # bulk_create обходит сигналы: пересчитываем счётчики.
+        recount()
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.id])
+        cls.comments_url = reverse('posts:post_comments', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def shown(self, response):
+        return [
+            int(number) for number in
+            re.findall(r'Комментарий (\d+)', response.content.decode())
+        ]
+
+    def test_post_detail_shows_first_comments(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(
+            self.shown(response),
+            list(range(self.total - 1, self.total - 1 - COMMENTS_ON_PAGE, -1))
+        )
+        cursor = response.context['comments'].paginator.next_cursor
+        self.assertContains(response, f'{self.comments_url}?cursor={cursor}')
+        rest = self.client.get(self.detail_url, {'cursor': cursor})
+        self.assertEqual(self.shown(rest), [4, 3, 2, 1, 0])
+        self.assertIsNone(rest.context['comments'].paginator.next_cursor)
+
+    def test_comments_endpoint_returns_next_slice(self):
+        first = self.client.get(self.detail_url)
+        cursor = first.context['comments'].paginator.next_cursor
+        with self.assertNumQueries(1):
+            fragment = self.client.get(self.comments_url, {'cursor': cursor})
+        self.assertTemplateUsed(fragment, 'posts/includes/comments.html')
+        self.assertEqual(self.shown(fragment), [4, 3, 2, 1, 0])
+        self.assertNotContains(fragment, 'data-comments')
+
+        data = self.client.get(
+            self.comments_url, {'format': 'json'}
+        ).json()
+        self.assertEqual(len(data['results']), COMMENTS_ON_PAGE)
+        self.assertEqual(
+            data['results'][0]['author'], TEST_AUTHOR['username']
+        )
+        rest = self.client.get(data['next']).json()
+        self.assertEqual(
+            [comment['text'] for comment in rest['results']],
+            [f'Комментарий {i}' for i in range(4, -1, -1)]
+        )
+        self.assertIsNone(rest['next'])
+
+    def test_comments_of_missing_post_are_not_found(self):
+        missing_url = reverse('posts:post_comments', args=[self.post.id + 1])
+        self.assertEqual(self.client.get(missing_url).status_code, 404)
+        empty = Post.objects.create(
+            author=self.user_author, text=TEST_POST['text']
+        )
+        response = self.client.get(
+            reverse('posts:post_comments', args=[empty.id])
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.group = Group.objects.create(
+            title=TEST_GROUP['title'],
+            slug=TEST_GROUP['slug'],
+            description=TEST_GROUP['description']
+        )
+        cls.post = Post.objects.create(
+            author=cls.user_author, text=TEST_POST['text'], group=cls.group
+        )
+        Comment.objects.create(
+            author=cls.user_author, post=cls.post, text=TEST_COMMENT['text']
+        )
+        cls.index_url = reverse('posts:api_index')
+        cls.post_url = reverse('posts:api_post', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_shows_posts(self):
+        data = self.client.get(reverse(
+            'posts:api_group', args=[self.group.slug]
+        )).json()
+        self.assertEqual(data['next'], None)
+        post = data['results'][0]
+        self.assertEqual(post['id'], self.post.id)
+        self.assertEqual(post['text'], TEST_POST['text'])
+        self.assertEqual(post['author'], TEST_AUTHOR['username'])
+        self.assertEqual(post['group'], {
+            'slug': TEST_GROUP['slug'], 'title': TEST_GROUP['title']
+        })
+        self.assertEqual(post['comments_count'], 1)
+        self.assertIsNone(post['image'])
+
+    def test_feed_revalidation_skips_database(self):
+        response = self.client.get(self.index_url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            cached = self.client.get(
+                self.index_url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        Post.objects.create(author=self.user_author, text='Новый пост')
+        fresh = self.client.get(
+            self.index_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], response['ETag'])
+        self.assertEqual(len(fresh.json()['results']), 2)
+
+    def test_post_and_comments_are_tagged_by_content(self):
+        response = self.client.get(self.post_url)
+        data = response.json()
+        self.assertEqual(data['text'], TEST_POST['text'])
+        cached = self.client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(cached.status_code, 304)
+        comments = self.client.get(data['comments']).json()
+        self.assertEqual(
+            [comment['text'] for comment in comments['results']],
+            [TEST_COMMENT['text']]
+        )
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+        changed = self.client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
+
+    def test_comments_of_missing_post_are_not_found(self):
+        missing = self.post.id + 1
+        for url_name in ('posts:api_post', 'posts:api_comments'):
+            with self.subTest(url_name=url_name):
+                response = self.client.get(reverse(url_name, args=[missing]))
+                self.assertEqual(response.status_code, 404)
+                self.assertNotIn('ETag', response)
+
+    def test_follow_feed_needs_login(self):
+        url = reverse('posts:api_follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=self.user_author)
+        self.client.force_login(reader)
+        data = self.client.get(url).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']], [self.post.id]
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(
+            author=cls.user_author, text=TEST_POST['text']
+        )
+        cls.index_url = reverse('posts:index')
+        cls.profile_url = reverse(
+            'posts:profile', args=[cls.user_author.username]
+        )
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_anonymous_feed_is_public_and_revalidated(self):
+        response = self.client.get(self.index_url)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            cached = self.revalidate(self.index_url, response)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        cached = self.client.get(
+            self.index_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(cached.status_code, 304)
+        Post.objects.create(author=self.user_author, text='Новый пост')
+        self.assertEqual(
+            self.revalidate(self.index_url, response).status_code, 200
+        )
+
+    def test_follows_and_suggestions_of_reader_change_etag(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(self.profile_url)
+        self.assertEqual(
+            self.revalidate(self.profile_url, response).status_code, 304
+        )
+        # Подписка на другого автора меняет «Кого почитать»,
+        # но не сам профиль.
+        other = User.objects.create_user(username='Other')
+        self.client.get(reverse(
+            'posts:profile_follow', args=[other.username]
+        ))
+        followed = self.revalidate(self.profile_url, response)
+        self.assertEqual(followed.status_code, 200)
+        suggestions.compute()
+        self.assertEqual(
+            self.revalidate(self.profile_url, followed).status_code, 200
+        )
+
+    def test_user_pages_are_private(self):
+        anonymous = self.client.get(self.index_url)
+        self.client.force_login(self.reader)
+        response = self.client.get(self.index_url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertEqual(
+            self.revalidate(self.index_url, anonymous).status_code, 200
+        )
+        self.assertEqual(
+            self.revalidate(self.index_url, response).status_code, 304
+        )
+
+    def test_follow_and_comment_change_validators(self):
+        self.client.force_login(self.reader)
+        profile = self.client.get(self.profile_url)
+        self.assertEqual(
+            self.revalidate(self.profile_url, profile).status_code, 304
+        )
+        self.client.get(reverse(
+            'posts:profile_follow', args=[self.user_author.username]
+        ))
+        self.assertContains(
+            self.revalidate(self.profile_url, profile), 'Отписаться'
+        )
+        detail = self.client.get(self.detail_url)
+        Comment.objects.create(
+            author=self.reader, post=self.post, text=TEST_COMMENT['text']
+        )
+        self.assertContains(
+            self.revalidate(self.detail_url, detail), TEST_COMMENT['text']
+        )
+
+    def test_missing_page_is_not_cached(self):
+        response = self.client.get(reverse('posts:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(
+            author=cls.user_author, text=TEST_POST['text']
+        )
+        cls.index_url = reverse('posts:index')
+        cls.profile_url = reverse(
+            'posts:profile', args=[cls.user_author.username]
+        )
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.user_author)
+
+    def test_anonymous_page_is_served_whole(self):
+        first = self.client.get(self.index_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.index_url)
+        self.assertEqual(second.content, first.content)
+        self.assertTemplateNotUsed(second, 'posts/index.html')
+        self.assertNotContains(second, '<!--hole')
+
+    def test_reader_holes_are_filled_in_shared_page(self):
+        self.client.get(self.profile_url)
+        response = self.reader_client.get(self.profile_url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Пользователь: Reader')
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, '<!--hole')
+        anonymous = self.client.get(self.profile_url)
+        self.assertContains(anonymous, 'Войти')
+        self.assertNotContains(anonymous, 'Подписаться')
+        own = self.author_client.get(self.profile_url)
+        self.assertNotContains(own, 'Подписаться')
+
+    def test_post_actions_are_personal(self):
+        self.client.get(self.detail_url)
+        reader = self.reader_client.get(self.detail_url)
+        self.assertContains(reader, 'csrfmiddlewaretoken')
+        self.assertNotContains(reader, 'редактировать запись')
+        author = self.author_client.get(self.detail_url)
+        self.assertContains(author, 'редактировать запись')
+        anonymous = self.client.get(self.detail_url)
+        self.assertNotContains(anonymous, 'csrfmiddlewaretoken')
+
+
+class CommitTimeInvalidationTests(TransactionTestCase):
+    """Pages rendered while a write is not committed are not reused."""
+
+    @contextmanager
+    def before_commit(self, model, **filters):
+        """
+        What another connection reads until the commit: the rows
+        written by the open transaction are not there yet.
+        """
+        savepoint = transaction.savepoint()
+        where = ' AND '.join(f'{column} = %s' for column in filters)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} WHERE {where}',
+                list(filters.values())
+            )
+        try:
+            yield
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def setUp(self):
+        cache.clear()
+        self.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        self.index_url = reverse('posts:index')
+
+    def test_page_rendered_before_commit_is_not_reused(self):
+        self.client.get(self.index_url)
+        with transaction.atomic():
+            post = Post.objects.create(
+                author=self.user_author, text='Пост из транзакции'
+            )
+            with self.before_commit(Post, id=post.id):
+                stale = self.client.get(self.index_url)
+            self.assertNotContains(stale, post.text)
+        response = self.client.get(self.index_url)
+        self.assertContains(response, post.text)
+        self.assertNotEqual(response['ETag'], stale['ETag'])
+
+    def test_followed_authors_read_before_commit_are_not_reused(self):
+        reader = User.objects.create_user(username='Reader')
+        with transaction.atomic():
+            follows.follow_many(reader.id, [self.user_author.id])
+            with self.before_commit(Follow, user_id=reader.id):
+                self.assertFalse(
+                    graph.is_following(reader.id, self.user_author.id)
+                )
+        self.assertEqual(
+            list(graph.following(reader.id)), [self.user_author.id]
+        )
+        self.assertTrue(graph.is_following(reader.id, self.user_author.id))
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -332,6 +796,35 @@ class FollowTests(TestCase):
             author=self.user_3
         ).exists())
 
+    def test_repeated_follow_and_unfollow_change_nothing(self):
+        follow_url = reverse(
+            'posts:profile_follow', args=[self.user_3.username]
+        )
+        unfollow_url = reverse(
+            'posts:profile_unfollow', args=[self.user_3.username]
+        )
+        for _ in range(2):
+            self.user_author_client.get(follow_url)
+        self.user_3.stats.refresh_from_db()
+        self.assertEqual(self.user_3.stats.followers_count, 1)
+        for _ in range(2):
+            response = self.user_author_client.get(unfollow_url)
+        self.assertRedirects(response, reverse(
+            'posts:profile', args=[self.user_3.username]
+        ))
+        self.user_3.stats.refresh_from_db()
+        self.assertEqual(self.user_3.stats.followers_count, 0)
+        self.user_author_client.get(reverse(
+            'posts:profile_follow', args=[self.user_author.username]
+        ))
+        self.assertFalse(
+            Follow.objects.filter(author=self.user_author).exists()
+        )
+        response = self.user_author_client.get(reverse(
+            'posts:profile_follow', args=['nobody']
+        ))
+        self.assertEqual(response.status_code, 404)
+
     def test_follow_index_page_shows_correct_content(self):
         new_post_user_2 = Post.objects.create(
             text='Новый пост автора 2',
@@ -355,6 +848,215 @@ class FollowTests(TestCase):
             first_post_on_page_id = None
         self.assertNotEqual(new_post_user_2.id, first_post_on_page_id)
 
+    def test_follow_feed_is_materialized(self):
+        """New posts, follows and unfollows keep FeedEntry in sync."""
+        post = Post.objects.create(text='Пост в ленту', author=self.user_2)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user_author, post=post
+        ).exists())
+
+        old_post = Post.objects.create(text='Старый пост', author=self.user_3)
+        self.user_author_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_3.username}
+        ))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user_author, post=old_post
+        ).exists())
+
+        self.user_author_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user_3.username}
+        ))
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.user_author, author=self.user_3
+        ).exists())
+
+    def test_follow_and_unfollow_of_unknown_user_are_not_found(self):
+        for url_name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(url_name=url_name):
+                response = self.user_author_client.get(
+                    reverse(url_name, args=['nobody'])
+                )
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Posts of authors above the threshold are not fanned out."""
+        own_post = Post.objects.create(text='Пост', author=self.user_2)
+        FeedEntry.objects.create(
+            user=self.user_author,
+            post=own_post,
+            author=self.user_2,
+            pub_date=own_post.pub_date
+        )
+        celebrity_post = Post.objects.create(
+            text='Пост звезды', author=self.user_2
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(post=celebrity_post).exists()
+        )
+        response = self.user_author_client.get(
+            self.pages_attribs['follow_index']['reversed_name']
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), [celebrity_post, own_post]
+        )
+
+    @override_settings(FEED_FANOUT_THRESHOLD=2)
+    def test_crossing_the_threshold_keeps_the_feeds_whole(self):
+        """Posts written as a celebrity stay in the feeds after it."""
+        follow_index = self.pages_attribs['follow_index']['reversed_name']
+        user_3_client = Client()
+        user_3_client.force_login(self.user_3)
+        fanned_post = Post.objects.create(text='Пост', author=self.user_2)
+        user_3_client.get(reverse(
+            'posts:profile_follow', args=[self.user_2.username]
+        ))
+        self.assertTrue(feed.is_celebrity(self.user_2.id))
+        celebrity_post = Post.objects.create(
+            text='Пост звезды', author=self.user_2
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(post=celebrity_post).exists()
+        )
+        for client in (self.user_author_client, user_3_client):
+            response = client.get(follow_index)
+            self.assertEqual(
+                list(response.context['page_obj']),
+                [celebrity_post, fanned_post]
+            )
+        user_3_client.get(reverse(
+            'posts:profile_unfollow', args=[self.user_2.username]
+        ))
+        self.assertFalse(feed.is_celebrity(self.user_2.id))
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('user_id', 'post_id')),
+            {
+                (self.user_author.id, fanned_post.id),
+                (self.user_author.id, celebrity_post.id),
+            }
+        )
+        response = self.user_author_client.get(follow_index)
+        self.assertEqual(
+            list(response.context['page_obj']), [celebrity_post, fanned_post]
+        )
+
+    def test_follow_graph_is_cached_and_invalidated(self):
+        user_id = self.user_author.id
+        self.assertTrue(graph.is_following(user_id, self.user_2.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(graph.is_following(user_id, self.user_3.id))
+        self.user_author_client.get(reverse(
+            'posts:profile_follow', args=[self.user_3.username]
+        ))
+        self.assertEqual(
+            list(graph.following(user_id)),
+            sorted([self.user_2.id, self.user_3.id])
+        )
+        self.user_author_client.post(reverse('posts:api_follow_batch'), {
+            'unfollow': [self.user_2.username, self.user_3.username]
+        })
+        self.assertFalse(graph.is_following(user_id, self.user_2.id))
+        self.assertFalse(graph.is_following(user_id, self.user_3.id))
+
+    def test_batch_follow_keeps_counters_and_feeds(self):
+        batch_url = reverse('posts:api_follow_batch')
+        post = Post.objects.create(text='Пост автора 3', author=self.user_3)
+        response = self.user_author_client.post(batch_url, {'follow': [
+            self.user_3.username, self.user_2.username,
+            self.user_author.username, 'nobody',
+        ]})
+        self.assertEqual(response.json(), {
+            'followed': [self.user_3.username],
+            'unfollowed': [],
+            'unknown': ['nobody'],
+        })
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user_author, post=post
+        ).exists())
+        self.assertEqual(set(recount().values()), {0})
+
+        response = self.user_author_client.post(
+            batch_url,
+            {'unfollow': [self.user_2.username, self.user_3.username]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['unfollowed'], [
+            self.user_2.username, self.user_3.username
+        ])
+        self.assertFalse(Follow.objects.filter(user=self.user_author))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user_author))
+        self.assertEqual(set(recount().values()), {0})
+
+    def test_single_and_batch_unfollow_share_side_effects(self):
+        Post.objects.create(text='Пост автора 2', author=self.user_2)
+        Post.objects.create(text='Пост автора 3', author=self.user_3)
+        follows.follow_many(self.user_author.id, [self.user_3.id])
+        self.assertEqual(
+            list(graph.following(self.user_author.id)),
+            sorted([self.user_2.id, self.user_3.id])
+        )
+        self.user_author_client.get(reverse(
+            'posts:profile_unfollow', args=[self.user_2.username]
+        ))
+        with CaptureQueriesContext(connection) as captured:
+            follows.unfollow_many(self.user_author.id, [self.user_3.id])
+        self.assertEqual(
+            [
+                query['sql'] for query in captured
+                if query['sql'].startswith(
+                    f'DELETE FROM {Follow._meta.db_table}'
+                )
+            ],
+            [
+                f'DELETE FROM {Follow._meta.db_table} '
+                f'WHERE user_id = {self.user_author.id} '
+                f'AND author_id IN ({self.user_3.id})'
+            ]
+        )
+        self.assertEqual(list(graph.following(self.user_author.id)), [])
+        self.assertFalse(FeedEntry.objects.filter(user=self.user_author))
+        self.assertEqual(set(recount().values()), {0})
+
+    def test_batch_follow_queries_do_not_grow_with_authors(self):
+        batch_url = reverse('posts:api_follow_batch')
+        names = [
+            User.objects.create_user(username=f'Batch {i}').username
+            for i in range(20)
+        ]
+        for username in names:
+            Post.objects.create(text='Пост', author=User.objects.get(
+                username=username
+            ))
+        queries = []
+        for batch in (names[:2], names[2:]):
+            with CaptureQueriesContext(connection) as captured:
+                self.user_2_client.post(batch_url, {'follow': batch})
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user_2).count(), 20
+        )
+
+    def test_batch_follow_rejects_bad_requests(self):
+        batch_url = reverse('posts:api_follow_batch')
+        self.assertEqual(self.guest_client.post(batch_url).status_code, 401)
+        self.assertEqual(
+            self.user_2_client.get(batch_url).status_code, 405
+        )
+        for body in ('[]', '{"follow": "Author"}', 'not json'):
+            with self.subTest(body=body):
+                response = self.user_2_client.post(
+                    batch_url, body, content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 400)
+        with override_settings(FOLLOW_BATCH_LIMIT=1):
+            response = self.user_2_client.post(
+                batch_url, {'follow': ['a', 'b']}
+            )
+        self.assertEqual(response.status_code, 400)
+
 
 class PaginatorTests(TestCase):
     @classmethod
@@ -381,6 +1083,8 @@ class PaginatorTests(TestCase):
             )
             posts_list.append(post)
         Post.objects.bulk_create(posts_list)
+        # bulk_create обходит сигналы: пересчитываем счётчики.
+        recount()
 
         cls.pages_to_be_tested = [
             'index',
@@ -408,6 +1112,76 @@ class PaginatorTests(TestCase):
                 )
                 self.assertEqual(len(response.context['page_obj']), 5)
 
+    def test_cursor_pages_walk_posts_in_order(self):
+        """Cursor links walk all posts forth and back without repeats."""
+        for page_name in self.pages_to_be_tested:
+            with self.subTest(page_name=page_name):
+                url = self.pages_attribs[page_name]['reversed_name']
+                first_page = self.author_client.get(url).context['page_obj']
+                self.assertTrue(first_page.has_next())
+                self.assertFalse(first_page.has_previous())
+
+                second_page = self.author_client.get(
+                    url, {'cursor': first_page.paginator.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second_page), 5)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    {post.id for post in first_page}
+                    | {post.id for post in second_page},
+                    set(Post.objects.values_list('id', flat=True))
+                )
+
+                back_page = self.author_client.get(
+                    url, {'cursor': second_page.paginator.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back_page), list(first_page))
+
+                last_page = self.author_client.get(
+                    url, {'cursor': first_page.paginator.last_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(last_page), 10)
+                self.assertEqual(last_page[9], second_page[4])
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.author_client.get(
+            self.pages_attribs['index']['reversed_name'], {'cursor': '%%%'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    @override_settings(PAGE_WINDOW=2)
+    def test_page_window_is_bounded(self):
+        paginator = Paginator(range(10000), 10)
+        windows = {
+            1: [1, 2, 3, None, 1000],
+            4: [1, 2, 3, 4, 5, 6, None, 1000],
+            500: [1, None, 498, 499, 500, 501, 502, None, 1000],
+            1000: [1, None, 998, 999, 1000],
+        }
+        for number, window in windows.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    page_window(paginator.page(number)), window
+                )
+        self.assertEqual(page_window(Paginator(range(15), 10).page(2)), [1, 2])
+
+    @override_settings(PAGE_WINDOW=2)
+    def test_numbered_pages_link_a_window(self):
+        Post.objects.bulk_create(
+            Post(author=self.user_author, text=f'Пост {i}')
+            for i in range(200)
+        )
+        recount()
+        cache.clear()
+        response = self.author_client.get(
+            self.pages_attribs['index']['reversed_name'], {'page': 10}
+        )
+        content = response.content.decode()
+        for number in (1, 8, 12, 22):
+            self.assertIn(f'?page={number}"', content)
+        for number in (2, 7, 13, 21):
+            self.assertNotIn(f'?page={number}"', content)
+
 
 class CashTests(TestCase):
     @classmethod
@@ -430,6 +1204,7 @@ class CashTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.author_client = Client()
         self.author_client.force_login(self.user_author)
 
@@ -441,7 +1216,8 @@ class CashTests(TestCase):
         content_1 = response_1.content
         first_post_1 = response_1.context['page_obj'][0]
 
-        Post.objects.get(id=first_post_1.id).delete()
+        # update() не шлёт сигналов, поэтому кэш остаётся прежним.
+        Post.objects.filter(id=first_post_1.id).update(text='Новый текст')
 
         response_2 = self.author_client.get(
             self.pages_attribs['index']['reversed_name']
@@ -450,7 +1226,7 @@ class CashTests(TestCase):
 
         self.assertEqual(
             content_1, content_2,
-            'Кэширование index page не работает спустя <1 сек.'
+            'Кэширование index page не работает.'
         )
 
         cache.clear()
@@ -462,3 +1238,301 @@ class CashTests(TestCase):
         self.assertNotEqual(
             content_1, content_3,
             'Кэш index page не обновился после очистки кэша.')
+
+    def test_cached_pages_are_invalidated_on_write(self):
+        """New and deleted posts show up in every cached feed at once."""
+        pages = ('index', 'group_list', 'profile')
+        contents = {
+            page: self.author_client.get(
+                self.pages_attribs[page]['reversed_name']
+            ).content
+            for page in pages
+        }
+        post = Post.objects.create(
+            author=self.user_author,
+            text='Пост на удаление',
+            group=self.group_1
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.author_client.get(
+                    self.pages_attribs[page]['reversed_name']
+                )
+                self.assertIn('Пост на удаление', response.content.decode())
+
+        post.delete()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.author_client.get(
+                    self.pages_attribs[page]['reversed_name']
+                )
+                self.assertEqual(response.content, contents[page])
+
+    def test_cache_key_varies_by_page(self):
+        """Second page is never served from the first page's fragment."""
+        Post.objects.bulk_create([
+            Post(author=self.user_author, text=f'Пост номер {i}')
+            for i in range(10)
+        ])
+        cache.clear()
+        url = self.pages_attribs['index']['reversed_name']
+        first_page = self.author_client.get(url)
+        cursor = first_page.context['page_obj'].paginator.next_cursor
+        for query in ({'page': 2}, {'cursor': cursor}):
+            with self.subTest(query=query):
+                response = self.author_client.get(url, query)
+                self.assertIn(TEST_POST['text'], response.content.decode())
+                self.assertNotEqual(response.content, first_page.content)
+
+    def test_post_cards_are_memoized_per_version(self):
+        """A card renders once per post version, author and group."""
+        card = post_cards([self.post_1])[0]
+        Post.objects.filter(id=self.post_1.id).update(text='Без сигналов')
+        post = Post.objects.select_related('author', 'group').get(
+            id=self.post_1.id
+        )
+        self.assertEqual(post_cards([post])[0], card)
+        self.assertNotEqual(post_cards([post], 'profile')[0], card)
+
+        post.text = 'Отредактированный пост'
+        post.save()
+        self.assertIn('Отредактированный пост', post_cards([post])[0])
+
+        post.group.title = 'Переименованная группа'
+        self.assertIn('Переименованная группа', post_cards([post])[0])
+        self.assertNotIn(
+            'Переименованная группа', post_cards([post], 'group')[0]
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.url = reverse('posts:search')
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.user_author_2 = User.objects.create_user(username='SecondAuthor')
+        cls.group = Group.objects.create(
+            title=TEST_GROUP['title'],
+            slug=TEST_GROUP['slug'],
+            description=TEST_GROUP['description']
+        )
+        cls.best = Post.objects.create(
+            author=cls.user_author,
+            text='Кумкваты, кумкваты и ещё раз кумкваты',
+            group=cls.group
+        )
+        cls.other_author = Post.objects.create(
+            author=cls.user_author_2,
+            text='Где купить кумкват?'
+        )
+        cls.commented = Post.objects.create(
+            author=cls.user_author,
+            text='Фрукты на рынке'
+        )
+        Comment.objects.create(
+            author=cls.user_author_2,
+            post=cls.commented,
+            text='А кумкваты были?'
+        )
+        cls.unrelated = Post.objects.create(
+            author=cls.user_author,
+            text='Совсем про другое'
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        return [post.id for post in response.context['page_obj']]
+
+    def test_search_ranks_posts_and_comments(self):
+        found = self.search(q='кумкват')
+        self.assertEqual(found[0], self.best.id)
+        self.assertEqual(
+            set(found),
+            {self.best.id, self.other_author.id, self.commented.id}
+        )
+
+    def test_search_filters_by_group_and_author(self):
+        self.assertEqual(
+            self.search(q='кумкват', group=self.group.slug), [self.best.id]
+        )
+        self.assertEqual(
+            self.search(q='кумкват', author=self.user_author_2.username),
+            [self.other_author.id]
+        )
+
+    def test_query_syntax_is_not_passed_to_the_index(self):
+        self.assertEqual(
+            self.search(q='"кумкват* OR NEAR(('),
+            self.search(q='кумкват OR NEAR')
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        self.unrelated.text = 'Теперь тоже про кумкваты'
+        self.unrelated.save()
+        self.assertIn(self.unrelated.id, self.search(q='кумкват'))
+        self.commented.comments.all().delete()
+        self.assertNotIn(self.commented.id, self.search(q='кумкват'))
+        Post.objects.get(pk=self.best.pk).delete()
+        self.assertNotIn(self.best.id, self.search(q='кумкват'))
+
+    @override_settings(NUM_POSTS_ON_PAGE=2)
+    def test_search_cursor_walks_all_results(self):
+        paginator = SearchPaginator(
+            Post.objects.all(), 2, query='кумкват'
+        )
+        first_page = paginator.cursor_page()
+        self.assertTrue(first_page.has_next())
+        next_page = SearchPaginator(
+            Post.objects.all(), 2, query='кумкват'
+        ).cursor_page(paginator.next_cursor)
+        self.assertFalse(next_page.has_next())
+        self.assertEqual(
+            [post.id for post in first_page]
+            + [post.id for post in next_page],
+            self.search(q='кумкват')
+        )
+
+    @override_settings(SEARCH_RANK_WINDOW=1)
+    def test_only_recent_matches_are_ranked(self):
+        # Окно в каждом индексе: последний пост и последний комментарий.
+        self.assertEqual(
+            set(self.search(q='кумкват')),
+            {self.other_author.id, self.commented.id}
+        )
+
+    def test_comment_writes_index_only_the_comment(self):
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                author=self.user_author, post=self.unrelated,
+                text='Кумкват и тут'
+            )
+        self.assertFalse(
+            any(f'INTO {search.TABLE} ' in query['sql'] for query in queries)
+        )
+        self.assertIn(self.unrelated.id, self.search(q='кумкват'))
+        comment.delete()
+        self.assertNotIn(self.unrelated.id, self.search(q='кумкват'))
+
+    def test_post_delete_drops_comments_without_reindexing(self):
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.get(pk=self.commented.pk).delete()
+        statements = [query['sql'] for query in queries]
+        self.assertFalse(any('INSERT' in sql for sql in statements))
+        self.assertFalse(
+            any(sql.startswith('UPDATE "posts_post"') for sql in statements)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {search.COMMENTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кумкват'}
+        )
+        self.assertEqual(
+            {post.id for post in response.context['cl'].result_list},
+            {self.best.id, self.other_author.id}
+        )
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'кумкваты'}
+        )
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(
+            username=TEST_AUTHOR['username']
+        )
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.quiet_group = Group.objects.create(
+            title=TEST_GROUP['title'],
+            slug=TEST_GROUP['slug'],
+            description=TEST_GROUP['description']
+        )
+        cls.hot_group = Group.objects.create(
+            title=TEST_GROUP['title'] + ' 2',
+            slug=TEST_GROUP['slug'] + '_2',
+            description=TEST_GROUP['description'] + ' 2'
+        )
+        cls.discussed = Post.objects.create(
+            author=cls.reader, text=TEST_POST['text'], group=cls.hot_group
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user_author,
+                text=f'{TEST_POST["text"]} {i}',
+                group=cls.quiet_group
+            )
+            for i in range(4)
+        ]
+        for i in range(2):
+            Comment.objects.create(
+                author=cls.user_author, post=cls.discussed,
+                text=TEST_COMMENT['text']
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, url_name):
+        response = self.client.get(reverse(url_name))
+        return [item.id for item in response.context['page_obj']]
+
+    def test_comments_outweigh_newer_posts(self):
+        self.assertEqual(
+            self.ids('posts:trending'),
+            [self.discussed.id] + [post.id for post in self.posts[::-1]]
+        )
+        self.assertEqual(
+            self.ids('posts:hot_groups'),
+            [self.hot_group.id, self.quiet_group.id]
+        )
+
+    def test_events_decay_with_half_life(self):
+        now = timezone.now()
+        day_ago = now - timedelta(seconds=settings.TRENDING_HALF_LIFE)
+        self.assertAlmostEqual(
+            trending.event('post', now),
+            trending.event('post', day_ago, times=2)
+        )
+
+    def test_follow_heats_latest_post_of_author(self):
+        latest = self.posts[-1]
+        before = Post.objects.get(pk=latest.pk).trend
+        self.assertEqual(self.ids('posts:trending')[1], latest.id)
+        for username in ('Reader', 'Reader2'):
+            follower, _ = User.objects.get_or_create(username=username)
+            Follow.objects.create(user=follower, author=self.user_author)
+        self.assertGreater(Post.objects.get(pk=latest.pk).trend, before)
+        self.assertEqual(self.ids('posts:trending')[0], latest.id)
+
+    def test_rebuild_matches_incremental_scores(self):
+        scores = dict(Post.objects.values_list('id', 'trend'))
+        groups = dict(Group.objects.values_list('id', 'trend'))
+        trending.rebuild()
+        for post_id, trend in Post.objects.values_list('id', 'trend'):
+            self.assertAlmostEqual(trend, scores[post_id], places=4)
+        for group_id, trend in Group.objects.values_list('id', 'trend'):
+            self.assertAlmostEqual(trend, groups[group_id], places=4)
+
+    def test_trending_cursor_walks_all_posts(self):
+        paginator = trending.TrendingPaginator(Post.objects.all(), 2)
+        seen = [post.id for post in paginator.cursor_page()]
+        while paginator.next_cursor:
+            cursor = paginator.next_cursor
+            paginator = trending.TrendingPaginator(Post.objects.all(), 2)
+            seen += [post.id for post in paginator.cursor_page(cursor)]
+        self.assertEqual(seen, self.ids('posts:trending'))
+        self.assertIsNone(
+            trending.TrendingPaginator(Post.objects.all(), 2).decode('inf')
+        )
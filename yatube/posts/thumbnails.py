@@ -0,0 +1,144 @@
+"""
+Thumbnails of post images, rendered off the request path.
+
+PostForm queues every newly uploaded image once the transaction commits;
+a process pool renders all POST_THUMBNAIL_GEOMETRIES with sorl's
+get_thumbnail. Templates only look the thumbnail names up in the cache
+(post_thumbnails tag) and show a placeholder otherwise, so a request
+never decodes or resizes an image; a miss queues the image, which
+fills in older images and ones the cache lost. When a job finishes,
+the names go to the cache and the cached feed fragments showing the
+post are invalidated to pick up the image.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import connections
+from sorl.thumbnail import default, get_thumbnail
+
+from . import cache
+from .signals import post_scopes
+
+logger = logging.getLogger(__name__)
+
+# С обрезкой по центру размер миниатюры всегда равен геометрии:
+# шаблону не нужно открывать файл, чтобы узнать width и height.
+OPTIONS = {'upscale': True, 'crop': 'center'}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def cache_key(image_name):
+    return f'posts:thumbnails:{md5(image_name.encode()).hexdigest()}'
+
+
+def geometry_size(geometry):
+    return tuple(int(side) for side in geometry.split('x'))
+
+
+def render(image_name):
+    """
+    Renders every geometry of one image with sorl's get_thumbnail,
+    which skips the ones already in its store. Runs in a pool worker.
+    Returns the storage names of the thumbnails by geometry.
+    """
+    return {
+        geometry: get_thumbnail(image_name, geometry, **OPTIONS).name
+        for geometry in settings.POST_THUMBNAIL_GEOMETRIES
+    }
+
+
+def remember(image_name, names):
+    """Stores the rendered thumbnails for ready_thumbnail()."""
+    shared_cache.set(cache_key(image_name), names, None)
+
+
+def start_worker():
+    """Initializer of the pool processes."""
+    # Соединения с БД достались от родителя при fork: процесс пула
+    # открывает свои (хранилище sorl пишет в БД).
+    connections.close_all()
+
+
+def _executor_instance():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            initializer=start_worker
+        )
+    return _executor
+
+
+def _finished(image_name, scopes, future):
+    with _lock:
+        _pending.discard(image_name)
+    error = future.exception()
+    if error is not None:
+        logger.error(
+            'Миниатюры %s не созданы', image_name, exc_info=error
+        )
+        # Битую картинку страницы не ставят в очередь до таймаута.
+        shared_cache.set(
+            cache_key(image_name), {}, settings.FEED_CACHE_TIMEOUT
+        )
+        return
+    remember(image_name, future.result())
+    cache.invalidate(*scopes)
+
+
+def enqueue(post):
+    """Queues thumbnails of the post image, once per image."""
+    image_name = post.image.name
+    if not image_name:
+        return
+    with _lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+    done = partial(
+        _finished, image_name, post_scopes(post.author_id, post.group_id)
+    )
+    if not settings.POST_THUMBNAIL_WORKERS:
+        future = _run_inline(image_name)
+    else:
+        future = _executor_instance().submit(render, image_name)
+    future.add_done_callback(done)
+
+
+def _run_inline(image_name):
+    future = Future()
+    try:
+        future.set_result(render(image_name))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def ready_thumbnail(post, geometry):
+    """
+    Url and size of a rendered thumbnail of the post image, or None
+    while it is queued. Costs a single cache read; an image without
+    thumbnails in the cache, uploaded before the queue or lost by the
+    cache, is queued by the first page that shows it.
+    """
+    if not post.image:
+        return None
+    names = shared_cache.get(cache_key(post.image.name))
+    if names is None or names and geometry not in names:
+        enqueue(post)
+    if not names or geometry not in names:
+        return None
+    width, height = geometry_size(geometry)
+    return {
+        'url': default.storage.url(names[geometry]),
+        'width': width,
+        'height': height,
+    }
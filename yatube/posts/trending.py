@@ -0,0 +1,187 @@
+"""
+Trending posts and hot groups: engagement decayed with time.
+
+Every event (a post published, a comment, a follow of the author) is
+worth its TRENDING_WEIGHTS weight, halved every TRENDING_HALF_LIFE
+seconds. Instead of decaying every score as time goes by, each event
+is grown from a fixed EPOCH to its own moment (forward decay): a row
+keeps
+
+    trend = log(sum of weight * e^(rate * (moment - EPOCH)))
+
+and the order of these sums is the order of the decayed scores at any
+later time. Scores never have to be rewritten, so an index on
+(trend, id) keeps the ranking sorted and the top N is a walk down the
+index, as for the date-ordered feeds. The logarithm keeps the numbers
+far from overflow: an event adds to trend with one UPDATE computing
+log(e^trend + e^event) in place (posts.signals, posts.follows).
+
+A post is heated by its publication, its comments and the follows its
+author gains while it is the latest post; a group by the same events
+of its posts. Deleted comments and unfollows do not take the heat
+back: the engagement did happen. rebuild() recomputes the scores from
+posts and comments, Follow has no dates to replay.
+"""
+import math
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from . import cache
+from .paginator import NEXT, PREVIOUS, CursorPaginator, keyset, pack, unpack
+
+# Начало отсчёта: все события выращиваются до своего момента от него.
+# Сменить — значит пересчитать всё через rebuild().
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+SCOPE = 'trending'
+
+
+def rate():
+    return math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def event(kind, moment=None, times=1):
+    """Logarithm of the weight of `times` events grown to their moment."""
+    moment = moment or timezone.now()
+    return (
+        math.log(settings.TRENDING_WEIGHTS[kind] * times)
+        + rate() * (moment - EPOCH).total_seconds()
+    )
+
+
+def _added(value):
+    """log(e^trend + e^value), without leaving the logarithms."""
+    value = Value(value, output_field=FloatField())
+    trend = F('trend')
+    return Greatest(trend, value) + Ln(1.0 + Exp(-Abs(trend - value)))
+
+
+def heat(queryset, kind, times=1):
+    """Adds the events to every row of the queryset in one UPDATE."""
+    return queryset.update(trend=_added(event(kind, times=times)))
+
+
+def commented(post_id):
+    """A new comment heats its post and the post's group."""
+    Post = django_apps.get_model('posts', 'Post')
+    Group = django_apps.get_model('posts', 'Group')
+    heat(Post.objects.filter(pk=post_id), 'comment')
+    heat(Group.objects.filter(posts=post_id), 'comment')
+
+
+def followed(author_ids):
+    """New follows heat the latest post of each author and its group."""
+    Post = django_apps.get_model('posts', 'Post')
+    Group = django_apps.get_model('posts', 'Group')
+    latest = Post.objects.filter(
+        author_id=OuterRef('author_id')
+    ).order_by('-pub_date', '-id').values('id')[:1]
+    posts = list(
+        Post.objects.filter(
+            author_id__in=author_ids, id=Subquery(latest)
+        ).values_list('id', 'group_id')
+    )
+    if not posts:
+        return
+    heat(Post.objects.filter(pk__in=[post_id for post_id, _ in posts]),
+         'follow')
+    groups = Counter(group_id for _, group_id in posts if group_id)
+    # По UPDATE на каждое число подписок, обычно один.
+    for times in set(groups.values()):
+        heat(
+            Group.objects.filter(pk__in=[
+                group_id for group_id, count in groups.items()
+                if count == times
+            ]),
+            'follow', times
+        )
+    cache.invalidate(SCOPE)
+
+
+def _event_sql(kind, column):
+    """event() of the rows in SQL: the column holds the moment."""
+    return (
+        f'{math.log(settings.TRENDING_WEIGHTS[kind])!r} + {rate()!r} * '
+        f"(julianday({column}) - julianday('{EPOCH:%Y-%m-%d %H:%M:%S}'))"
+        ' * 86400'
+    )
+
+
+def _score_sql(events, key):
+    """Log-sum-exp of the events per key, shifted by the largest one."""
+    return (
+        f'SELECT event.{key} AS id, top.x + LN(SUM(EXP(event.x - top.x))) '
+        f'AS trend FROM ({events}) AS event JOIN ('
+        f'SELECT {key}, MAX(x) AS x FROM ({events}) GROUP BY {key}'
+        f') AS top ON top.{key} = event.{key} GROUP BY event.{key}'
+    )
+
+
+def rebuild(apps=django_apps, schema_editor=None):
+    """
+    Recomputes every score from the dates of the posts and comments,
+    for data loaded around the signals.
+    """
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    comments = apps.get_model('posts', 'Comment')._meta.db_table
+    groups = apps.get_model('posts', 'Group')._meta.db_table
+    events = (
+        f'SELECT id AS post_id, group_id, '
+        f'{_event_sql("post", "pub_date")} AS x FROM {posts} '
+        f'UNION ALL SELECT post.id, post.group_id, '
+        f'{_event_sql("comment", "comment.created")} '
+        f'FROM {comments} AS comment '
+        f'JOIN {posts} AS post ON post.id = comment.post_id'
+    )
+    db = schema_editor.connection if schema_editor else connection
+    with transaction.atomic(using=db.alias), db.cursor() as cursor:
+        for table, key in ((posts, 'post_id'), (groups, 'group_id')):
+            cursor.execute(f'UPDATE {table} SET trend = 0')
+            cursor.execute(
+                f'UPDATE {table} SET trend = score.trend '
+                f'FROM ({_score_sql(events, key)}) AS score '
+                f'WHERE score.id = {table}.id'
+            )
+
+
+class TrendingPaginator(CursorPaginator):
+    """
+    Cursor pages of posts or groups, the hottest first. Scores move
+    while a reader pages: a row heated in between may show up again
+    or be missed at a page boundary, as in any live ranking.
+    """
+    ordering = ('-trend', '-id')
+
+    def encode(self, direction, item=None):
+        """Token of the page boundary: (trend, id) of the row."""
+        if item is None:
+            return pack(direction)
+        return pack(direction, repr(item.trend), item.id)
+
+    def decode(self, token):
+        parts = unpack(token)
+        if parts == [PREVIOUS]:
+            return PREVIOUS, None, None
+        if parts is None or len(parts) != 3 or parts[0] not in (
+            NEXT, PREVIOUS
+        ):
+            return None
+        try:
+            trend = float(parts[1])
+            item_id = int(parts[2])
+        except ValueError:
+            return None
+        if not math.isfinite(trend):
+            return None
+        return parts[0], trend, item_id
+
+    def fetch(self, direction, trend, item_id, limit):
+        return list(keyset(
+            self.object_list, direction, trend, item_id, date_field='trend'
+        )[:limit])
@@ -0,0 +1,80 @@
+"""
+Normalization of uploaded post images.
+
+Django already streams large uploads to a temporary file. Here the file
+is checked by its size and header before any pixel is decoded, JPEGs
+are decoded straight at a reduced scale (libjpeg draft mode), and the
+result is re-encoded without metadata: memory per upload is bounded by
+POST_IMAGE_MAX_PIXELS whatever the client sends.
+"""
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+
+
+def fit(size, max_side):
+    """Size scaled down to fit a max_side square, keeping the ratio."""
+    width, height = size
+    ratio = min(1, max_side / max(width, height))
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def process_image(upload):
+    """
+    Downscaled, metadata-free copy of an uploaded image: JPEG,
+    or PNG when the image is transparent.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+            code='file_too_large'
+        )
+    upload.seek(0)
+    # Image.open читает только заголовок: размер известен до декодирования.
+    with Image.open(upload) as source:
+        size = fit(source.size, settings.POST_IMAGE_MAX_SIDE)
+        # Для JPEG декодер сразу уменьшает картинку в 2, 4 или 8 раз.
+        source.draft('RGB', size)
+        if source.width * source.height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка слишком большая: %(width)d×%(height)d.',
+                params={'width': source.width, 'height': source.height},
+                code='image_too_large'
+            )
+        source.thumbnail(size, Image.LANCZOS)
+        if source.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            source = ImageOps.exif_transpose(source)
+        if has_alpha(source):
+            image = source.convert('RGBA')
+            extension, params = 'png', {'format': 'PNG', 'optimize': True}
+        else:
+            image = source.convert('RGB')
+            extension, params = 'jpg', {
+                'format': 'JPEG',
+                'quality': settings.POST_IMAGE_QUALITY,
+                'optimize': True,
+                'progressive': True,
+            }
+    # EXIF, ICC-профиль и комментарии не переносим.
+    image.info = {}
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(output, **params)
+    image.close()
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=f'{name}.{extension}')
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -9,6 +9,9 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('create/', views.create_post, name='create_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('trending/', views.trending, name='trending'),
+    path('groups/hot/', views.hot_groups, name='hot_groups'),
+    path('search/', views.search, name='search'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path(
         'profile/<str:username>/follow/',
@@ -21,7 +24,27 @@ urlpatterns = [
         name="profile_unfollow"
     ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group'),
+    path(
+        'api/profile/<str:username>/', api.profile, name='api_profile'
+    ),
+    path('api/follow/', api.follow_index, name='api_follow'),
+    path(
+        'api/follow/batch/', api.follow_batch, name='api_follow_batch'
+    ),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post'),
+    path(
+        'api/posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='api_comments'
+    ),
 ]
@@ -1,14 +1,24 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-# from django.core.cache import cache
-from django.core.exceptions import ObjectDoesNotExist
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
-from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow
-from yatube.settings import NUM_POSTS_ON_PAGE
+from . import api, graph
+from .cache import feed_cache_context
+from .conditional import (
+    conditional_page, detail_scopes, group_scopes, index_scopes,
+    profile_scopes, trending_scopes
+)
+from .counters import user_stats
+from .feed import FollowFeedPaginator
+from .forms import CommentForm, PostForm, SearchForm
+from .models import Comment, Group, Post, Follow
+from .paginator import CommentPaginator, paginate
+from .search import SearchPaginator
+from .trending import SCOPE as TRENDING, TrendingPaginator
+from core.db import retry_locked
+from yatube.settings import COMMENTS_ON_PAGE, NUM_POSTS_ON_PAGE
 
 User = get_user_model()
 
@@ -24,12 +34,10 @@ def create_post(request):
         instance=post
     )
     if form.is_valid():
-        username = request.user.username
-        author = User.objects.get(username=username)
-        form.instance.author = author
-        form.save()
+        form.instance.author = request.user
+        retry_locked(transaction.atomic(form.save))()
         return redirect(
-            reverse('posts:profile', args=[username])
+            reverse('posts:profile', args=[request.user.username])
         )
     return render(request, template, {'form': form})
 
@@ -40,7 +48,7 @@ def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, id=post_id)
 
-    if post.author != request.user:
+    if post.author_id != request.user.id:
         return redirect(reverse('posts:post_detail', args=[post_id]))
 
     form = PostForm(
@@ -50,7 +58,7 @@ def post_edit(request, post_id):
     )
 
     if form.is_valid():
-        form.save()
+        retry_locked(transaction.atomic(form.save))()
         return redirect(reverse('posts:post_detail', args=[post_id]))
 
     context = {
@@ -61,126 +69,210 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@conditional_page(index_scopes)
 def index(request):
-    """Main page."""
+    """Main page. Queries: the posts page."""
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    # post_list = cache.get('index_page')
-    # if post_list is None:
-    #     post_list = Post.objects.all()
-    #     cache.set('index_page', post_list, timeout=20)
-    paginator = Paginator(post_list, NUM_POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
-        'index': True
+        **feed_cache_context(request, 'index')
+    }
+    return render(request, template, context)
+
+
+@conditional_page(trending_scopes)
+def trending(request):
+    """Posts by decayed engagement, hottest first. Queries: the page."""
+    template = 'posts/trending.html'
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list, TrendingPaginator)
+    context = {
+        'page_obj': page_obj,
+        **feed_cache_context(request, TRENDING)
+    }
+    return render(request, template, context)
+
+
+@conditional_page(trending_scopes)
+def hot_groups(request):
+    """Groups by decayed engagement of their posts. Queries: the page."""
+    template = 'posts/hot_groups.html'
+    page_obj = paginate(request, Group.objects.all(), TrendingPaginator)
+    context = {
+        'page_obj': page_obj,
+        **feed_cache_context(request, TRENDING)
     }
     return render(request, template, context)
 
 
 @login_required
 def follow_index(request):
-    """Posts list of authors the user is following."""
+    """
+    Posts list of authors the user is following. Queries: the followed
+    authors (posts/graph.py, cached), the feed page, followed celebrities.
+    """
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, NUM_POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.filter(
+        author_id__in=list(graph.following(request.user.id))
+    ).select_related('author', 'group')
+    page_obj = paginate(
+        request, post_list, FollowFeedPaginator, user=request.user
+    )
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    """
+    Full-text search with group and author filters.
+    Queries: groups for the filter, the filters, the index, the posts.
+    """
+    template = 'posts/search.html'
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid() and form.cleaned_data['q']:
+        group = form.cleaned_data['group']
+        author = form.cleaned_data['author']
+        paginator = SearchPaginator(
+            Post.objects.select_related('author', 'group'),
+            NUM_POSTS_ON_PAGE,
+            query=form.cleaned_data['q'],
+            group_id=group.id if group else None,
+            author_id=author.id if author else None
+        )
+        page_obj = paginator.cursor_page(request.GET.get('cursor'))
+    params = request.GET.copy()
+    params.pop('cursor', None)
     context = {
+        'form': form,
         'page_obj': page_obj,
-        'follow': True
+        'query_string': params.urlencode()
     }
     return render(request, template, context)
 
 
+@conditional_page(group_scopes)
 def group_posts(request, slug):
-    """Posts by group."""
+    """Posts by group. Queries: the group, the posts page."""
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, NUM_POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author')
+    page_obj = paginate(request, post_list, count=group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(request, f'group:{group.id}')
     }
     return render(request, template, context)
 
 
+@conditional_page(profile_scopes)
 def profile(request, username):
-    """User profile."""
+    """
+    User profile. Queries: the author with counters, the posts page;
+    the follow button is a hole of the cached page (posts/holes.py).
+    """
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
-    user = request.user
-    following = False
-    if request.user.is_authenticated:
-        if Follow.objects.filter(
-            author=author,
-            user=user
-        ).exists():
-            following = True
-    paginator = Paginator(author_posts, NUM_POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = user_stats(author)
+    author_posts = author.posts.select_related('group')
+    page_obj = paginate(request, author_posts, count=stats.posts_count)
     context = {
         'author': author,
+        'stats': stats,
         'page_obj': page_obj,
-        'following': following
+        **feed_cache_context(request, f'author:{author.id}')
     }
     return render(request, template, context)
 
 
 @login_required
+@retry_locked
 def profile_follow(request, username):
-    """Add subscription to the post author."""
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    if not Follow.objects.filter(
-        author=author,
-        user=user
-    ).exists() and user != author:
-        new_follow = Follow(author=author, user=user)
-        new_follow.save()
-        return redirect('posts:profile', username=username)
+    """
+    Add subscription to the post author. Queries: the author id, the
+    subscription; a new one is inserted in a transaction of its own.
+    """
+    author_id = get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username
+    )
+    if author_id != request.user.id:
+        Follow.objects.get_or_create(user=request.user, author_id=author_id)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@retry_locked
 def profile_unfollow(request, username):
-    """Delete subscription to author from DB."""
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    try:
-        follow = Follow.objects.get(
-            author=author,
-            user=user
-        )
-    except ObjectDoesNotExist:
-        follow = None
-    if follow:
-        follow.delete()
-        return redirect('posts:profile', username=username)
+    """
+    Delete subscription to author from DB. Queries: the author id, the
+    subscription, its delete in a transaction of its own.
+    """
+    author_id = get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username
+    )
+    Follow.objects.filter(user=request.user, author_id=author_id).delete()
     return redirect('posts:profile', username=username)
 
 
+@conditional_page(detail_scopes)
 def post_detail(request, post_id):
-    """Post details."""
+    """
+    Post details. Queries: the post with author's counters,
+    the first page of comments.
+    """
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    comment_form = CommentForm()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     title = 'Пост ' + post.__str__()
+    paginator = CommentPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_ON_PAGE,
+        count=post.comments_count
+    )
     context = {
         'title': title,
         'post': post,
-        'form': comment_form
+        'author_stats': user_stats(post.author),
+        'comments': paginator.cursor_page(request.GET.get('cursor')),
     }
     return render(request, template, context)
 
 
+def post_comments(request, post_id):
+    """
+    Next slice of the post comments after the cursor: an HTML fragment
+    for post_detail. Queries: the comments; the post only for an empty
+    slice.
+    """
+    if request.GET.get('format') == 'json':
+        return api.post_comments(request, post_id)
+    paginator = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author')
+        .only(*api.COMMENT_FIELDS),
+        COMMENTS_ON_PAGE
+    )
+    comments = paginator.cursor_page(request.GET.get('cursor'))
+    if not comments:
+        # Комментарии удаляются с постом: непустая страница — уже
+        # доказательство, что пост есть.
+        get_object_or_404(Post.objects.only('id'), pk=post_id)
+    return render(request, 'posts/includes/comments.html', {
+        'post_id': post_id,
+        'comments': comments,
+    })
+
+
 @login_required
+@retry_locked
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,8 +40,13 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, чьи рендеры засекает core.middleware;
+        # имя движка прежнее.
+        'BACKEND': 'core.template.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        # Без явных 'loaders' и с DEBUG = False Django оборачивает загрузчики
+        # в cached.Loader: шаблон компилируется один раз на процесс.
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -55,14 +62,34 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Кэш и выборка замеров тестов (core/testing.py).
+TEST_RUNNER = 'core.testing.TestRunner'
+
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite с PRAGMA и BEGIN IMMEDIATE (core/sqlite3/base.py).
+        'ENGINE': 'core.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос: PRAGMA из SQLITE_PRAGMAS
+        # выполняются раз на соединение.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
     }
 }
 
+# PRAGMA каждого нового соединения с SQLite (core/sqlite3/base.py).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в КиБ: 64 МиБ страниц.
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+# Сколько раз повторить транзакцию, если SQLite занята (core/db.py).
+DATABASE_LOCK_RETRIES = 3
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,15 +134,113 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 NUM_POSTS_ON_PAGE = 10
+# Комментарии под постом приходят такими порциями.
+COMMENTS_ON_PAGE = 20
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_WINDOW = 3
+
+# Авторы с таким числом подписчиков не рассылают посты в ленты
+# подписчиков: их посты подмешиваются в /follow/ при чтении.
+FEED_FANOUT_THRESHOLD = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_LIMIT = 500
+# Сколько имён принимает пакетная подписка api/follow/batch/.
+FOLLOW_BATCH_LIMIT = 500
+# Сколько списков подписок держит в памяти каждый процесс (posts/graph.py).
+FOLLOW_GRAPH_LOCAL_SIZE = 10000
+# Сколько авторов предлагать в «Кого почитать» (posts/suggestions.py).
+SUGGESTIONS_COUNT = 5
+# Сколько самых похожих авторов помнить для каждого автора.
+SIMILAR_AUTHORS = 50
+# Популярное (posts/trending.py): вес события вдвое меньше через
+# TRENDING_HALF_LIFE секунд. Веса — пост, комментарий к нему и подписка
+# на автора (достаётся его последнему посту).
+TRENDING_HALF_LIFE = 60 * 60 * 24
+TRENDING_WEIGHTS = {'post': 1.0, 'comment': 2.0, 'follow': 3.0}
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Фрагменты лент сбрасываются сигналами (posts/cache.py), а не по таймауту.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Столько секунд браузер и прокси показывают ленту анониму без
+# перепроверки (posts/conditional.py).
+FEED_MAX_AGE = 60
+
+# Загруженные картинки постов (posts/uploads.py): больше POST_IMAGE_MAX_BYTES
+# не принимаются, уменьшаются до POST_IMAGE_MAX_SIDE по большей стороне и
+# пересохраняются без метаданных. POST_IMAGE_MAX_PIXELS ограничивает
+# декодируемую картинку, а с ней и память на одну загрузку.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_MAX_PIXELS = 16_000_000
+POST_IMAGE_QUALITY = 85
+
+# Поиск (posts/search.py) ранжирует столько самых свежих совпадений:
+# частые слова не заставляют оценивать всю таблицу.
+SEARCH_RANK_WINDOW = 2000
+
+# Миниатюры постов готовятся заранее (posts/thumbnails.py), шаблоны только
+# показывают готовые. Геометрии — все, что используют шаблоны.
+POST_THUMBNAIL_GEOMETRIES = ('960x339', '960x650')
+# Процессов в пуле миниатюр; 0 — рендерить сразу после коммита.
+POST_THUMBNAIL_WORKERS = 2
+
+# Доля запросов, для которых core.middleware пишет в лог и заголовок
+# Server-Timing время БД, шаблонов и обращения к кэшу.
+# Тесты выключают выборку (core.testing) и включают её сами.
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.environ.get('REQUEST_TIMING_SAMPLE_RATE', '0.01')
+)
+# Запросы дольше стольких мс попадают в лог и вне выборки.
+REQUEST_TIMING_SLOW_MS = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Кэш общий для всех процессов сервера: sqlite (core/cache.py) держит
+# его в одном файле, лучше в /dev/shm; file — файловый кэш Django.
+# locmem у каждого процесса свой, им пользуются тесты (core.testing).
+CACHE_BACKENDS = {
+    'sqlite': 'core.cache.SQLiteCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+CACHE_LOCATIONS = {
+    'sqlite': os.path.join(tempfile.gettempdir(), 'yatube-cache.sqlite3'),
+    'file': os.path.join(tempfile.gettempdir(), 'yatube-cache'),
+    'locmem': '',
+}
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND]
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+            # Только sqlite: предел размера значений в байтах.
+            'MAX_SIZE': int(
+                os.environ.get('CACHE_MAX_SIZE', 256 * 1024 * 1024)
+            ),
+        },
     }
 }
 